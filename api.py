@@ -0,0 +1,123 @@
+"""
+An API to embed the interpreter, running commands without printing to stdout
+or exiting the process.
+
+    results = run_many(["x = 5", "PRINT x", "y = z"], env)
+
+Each command gives a `Result`. PRINT output is kept in the result and sent
+to the optional `sink`, and EXIT! ends the batch with an "exit" status.
+"""
+
+from typing import Callable, NamedTuple
+
+import inputs
+from environment import SlotEnvironment
+from interfaces import Environment, Error, NodeType, describe
+from lexer import lexer
+from main import execute, parse
+from parser import parser
+
+# Receives the output of every PRINT, as the text it would print
+Sink = Callable[[str], object]
+
+
+class Result(NamedTuple):
+    """
+    The outcome of a command. `status` is "ok", "error" or "exit". `value` is
+    the value of an expression, or the value assigned by an assignment or a
+    BEG. On errors, `kind` is one of "syntax", "undefined", "value",
+    "arithmetic" or "runtime", the kind of type mismatches, and `error` is
+    the message the interpreter would show.
+    """
+
+    position: int
+    command: str
+    status: str
+    value: int | float | None = None
+    output: str | None = None
+    kind: str | None = None
+    error: str | None = None
+
+
+def run(
+    command: str, env: Environment, sink: Sink | None = None, position: int = 0
+) -> Result:
+    """
+    :param command str: the command to be run
+    :param env Environment: the variable environment of the program
+    :param sink Sink: receives the output of PRINT
+    :param position int: the position of the command, reported in its result
+    :return Result: the outcome of the command
+    """
+
+    try:
+        ast = parse(command)
+    except Error as e:
+        # the optimizer reports type mismatches between literals before the
+        # command runs, they are runtime errors like any other mismatch
+        kind = "runtime" if _parses(command) else "syntax"
+        return Result(position, command, "error", kind=kind, error=str(e))
+
+    try:
+        match ast.node_type:
+            case NodeType.EXIT:
+                return Result(position, command, "exit")
+            case NodeType.OUTPUT:
+                value = ast.children[0]
+                text = str(env[value] if ast.value == "VARIABLE" else value)
+                if sink is not None:
+                    sink(text)
+                return Result(position, command, "ok", output=text)
+            case NodeType.BEG:
+                variable = str(ast.value)
+                env[variable] = inputs.read(variable)
+                return Result(position, command, "ok", env[variable])
+            case NodeType.ASSIGNMENT:
+                execute(command, ast, env)
+                return Result(position, command, "ok", env[str(ast.value)])
+            case _:
+                return Result(position, command, "ok", execute(command, ast, env))
+    except KeyError as e:
+        return _failure(position, command, "undefined", e)
+    except ValueError as e:
+        return _failure(position, command, "value", e)
+    except ArithmeticError as e:
+        return _failure(position, command, "arithmetic", e)
+    except Error as e:
+        return _failure(position, command, "runtime", e)
+
+
+def _parses(command: str) -> bool:
+    try:
+        parser(lexer(command))
+    except Error:
+        return False
+    return True
+
+
+def _failure(position: int, command: str, kind: str, error: Exception) -> Result:
+    return Result(position, command, "error", kind=kind, error=describe(error))
+
+
+def run_many(
+    commands: list[str], env: Environment | None = None, sink: Sink | None = None
+) -> list[Result]:
+    """
+    Runs commands in order until one of them exits. Errors do not stop the
+    batch, they are reported in the result of their command.
+
+    :param env Environment: the variable environment, a new one by default
+    :return list[Result]: the result of every command that ran
+    """
+
+    env = env if env is not None else SlotEnvironment()
+    results = []
+
+    for position, command in enumerate(commands):
+        result = run(command, env, sink, position)
+        results.append(result)
+
+        if result.status == "exit":
+            break
+
+    return results
@@ -0,0 +1,291 @@
+"""
+Benchmarks for the SNOL interpreter.
+
+    python benchmark.py
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.1
+    python benchmark.py --lexer-comparison
+
+Every workload is measured per stage (lexer, parser, optimizer, evaluator) and
+end to end through `main.run_script`. Results can be stored as a JSON
+baseline, and a later run compared against it fails if the throughput of any
+measurement dropped by more than the threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import re
+import statistics
+import sys
+import time
+import timeit
+from typing import Callable, TypeAlias
+
+import main
+from cache import ParseCache
+from compiler import TieredEvaluator
+from environment import SlotEnvironment
+from evaluator import evaluator
+from interfaces import Token, Error
+from lexer import lexer, NUMBER, VARIABLE, OPERATOR
+from optimizer import optimizer
+from parser import parser
+
+
+def _reference_lexer(command: str) -> list[Token]:
+    """
+    The original lexer, which recompiles its pattern on every call and
+    classifies each token with further regex matches. Kept as the baseline
+    for the lexer benchmark.
+    """
+
+    definitions = "|".join(["BEG", "PRINT", "EXIT!", NUMBER, VARIABLE, OPERATOR, r"\S"])
+    pattern = re.compile(rf"{definitions}")
+
+    def helper(token: str) -> Token:
+        if re.match(NUMBER, token):
+            return ("NUMBER", token)
+        elif re.match(r"BEG|PRINT|EXIT!|=", token):
+            return ("KEYWORD", token)
+        elif re.match(r"[+-]", token):
+            return ("PRECEDENCE 1", token)
+        elif re.match(r"[*/%]", token):
+            return ("PRECEDENCE 2", token)
+        elif re.match(r"[()]", token):
+            return ("PRECEDENCE 3", token)
+        elif re.match(VARIABLE, token):
+            return ("VARIABLE", token)
+        else:
+            raise Error(f"Invalid token: {token}")
+
+    tokenized = [helper(token) for token in re.findall(pattern, command)]
+    tokenized.append(("EOF", "0"))
+
+    return tokenized
+
+
+def long_line(terms: int) -> str:
+    """
+    Generates an assignment whose expression has the given number of terms.
+    """
+
+    operators = "+-*/%"
+    parts = [f"x{i} {operators[i % 5]} {i}.5" for i in range(terms)]
+    return "y = " + " + ".join(parts)
+
+
+# ########################################################################
+# Workloads, each generating the lines of a script that runs without errors,
+# along with the variables bound before the script runs
+
+Workload: TypeAlias = tuple[list[str], dict[str, int | float]]
+
+
+def flat_expressions(lines: int = 200, terms: int = 50) -> Workload:
+    script = ["x = 7"]
+    for line in range(lines):
+        operands = [f"{(line + term) % 9 + 1}" for term in range(terms)]
+        script.append(f"y{line} = x + " + " + ".join(operands))
+    return script, {}
+
+
+def nested_parentheses(lines: int = 200, depth: int = 40) -> Workload:
+    script = ["x = 3"]
+    for line in range(lines):
+        expression = "x"
+        for level in range(depth):
+            expression = f"({expression} + {(line + level) % 5})"
+        script.append(f"y = {expression} * 2")
+    return script, {}
+
+
+def variable_heavy(variables: int = 500, lines: int = 2000) -> Workload:
+    script = [f"v{index} = {index}" for index in range(variables)]
+    for line in range(lines):
+        a, b, c = line % variables, (line * 7) % variables, (line * 13) % variables
+        script.append(f"v{a} = v{b} + v{c} - v{a} % 7")
+    return script, {}
+
+
+def float_heavy(lines: int = 2000) -> Workload:
+    # assignments truncate to int, so floats can only come from the bindings
+    script = []
+    for line in range(lines):
+        script.append(f"h = f * {line % 10 + 1}.5 / g - {line % 3}.125 + f * g")
+    return script, {"f": 1.5, "g": 2.25}
+
+
+def repeated_lines(lines: int = 5000) -> Workload:
+    return ["x = 1"] + ["x = x + 1"] * lines, {}
+
+
+WORKLOADS: dict[str, Callable[[], Workload]] = {
+    "flat": flat_expressions,
+    "nested": nested_parentheses,
+    "variables": variable_heavy,
+    "floats": float_heavy,
+    "repeated": repeated_lines,
+}
+
+
+# ########################################################################
+# Measurements
+
+
+def _measure(run: Callable[[], object], repeat: int) -> list[float]:
+    run()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _end_to_end(script: list[str], bindings: dict):
+    # every run starts with cold caches, like a fresh process would
+    cache, execute = main.cache, main.execute
+    main.cache = ParseCache(front_end=main.front_end)
+    main.execute = TieredEvaluator()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = main.run_script(script, SlotEnvironment(bindings))
+    finally:
+        main.cache, main.execute = cache, execute
+
+    if status:
+        raise Error("Benchmark workload failed")
+
+
+def _evaluate(asts: list, bindings: dict) -> None:
+    env = SlotEnvironment(bindings)
+    for ast in asts:
+        evaluator(ast, env)
+
+
+def bench_workload(workload: Workload, repeat: int) -> dict[str, list[float]]:
+    """
+    :return dict: the samples of each stage, in seconds per run over the
+                  whole script
+    """
+
+    script, bindings = workload
+    tokens = [lexer(line) for line in script]
+    asts = [parser(line) for line in tokens]
+    optimized = [optimizer(ast) for ast in asts]
+
+    return {
+        "lexer": _measure(lambda: [lexer(line) for line in script], repeat),
+        "parser": _measure(lambda: [parser(line) for line in tokens], repeat),
+        "optimizer": _measure(lambda: [optimizer(ast) for ast in asts], repeat),
+        "evaluator": _measure(lambda: _evaluate(optimized, bindings), repeat),
+        "end_to_end": _measure(lambda: _end_to_end(script, bindings), repeat),
+    }
+
+
+def _percentile(samples: list[float], percent: int) -> float:
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1]
+
+
+def summarize(samples: list[float], lines: int) -> dict[str, float]:
+    # a handful of samples has no meaningful tail percentile, the slowest run
+    # is reported instead
+    return {
+        "lines_per_second": lines / statistics.median(samples),
+        "p50_ms": _percentile(samples, 50) * 1000,
+        "p90_ms": _percentile(samples, 90) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def run_benchmarks(repeat: int = 10, workloads: list[str] | None = None) -> dict:
+    """
+    :return dict: the summary of every stage of every workload, keyed by
+                  "workload/stage"
+    """
+
+    results = {}
+
+    for name in workloads or WORKLOADS:
+        workload = WORKLOADS[name]()
+        for stage, samples in bench_workload(workload, repeat).items():
+            results[f"{name}/{stage}"] = summarize(samples, len(workload[0]))
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    :return list[str]: the measurements whose throughput dropped by more than
+                       the threshold, a fraction of the baseline
+    """
+
+    regressions = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        before = baseline[key]["lines_per_second"]
+        after = result["lines_per_second"]
+
+        if after < before * (1 - threshold):
+            regressions.append(f"{key}: {before:,.0f} -> {after:,.0f} lines/s")
+
+    return regressions
+
+
+def report(results: dict):
+    print(
+        f"{'benchmark':<24} {'lines/s':>14} {'p50 ms':>10} {'p90 ms':>10} {'max ms':>10}"
+    )
+    for key, result in results.items():
+        print(
+            f"{key:<24} {result['lines_per_second']:>14,.0f}"
+            f" {result['p50_ms']:>10.2f} {result['p90_ms']:>10.2f}"
+            f" {result['max_ms']:>10.2f}"
+        )
+
+
+def bench_lexer(terms: int = 1000, repeat: int = 5):
+    command = long_line(terms)
+    count = len(lexer(command))
+
+    for name, lex in [("before", _reference_lexer), ("after", lexer)]:
+        seconds = min(timeit.repeat(lambda: lex(command), number=10, repeat=repeat))
+        print(f"lexer {name:>6}: {count * 10 / seconds:>12,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Benchmark the interpreter")
+    arguments.add_argument("--repeat", type=int, default=10)
+    arguments.add_argument("--workload", action="append", choices=list(WORKLOADS))
+    arguments.add_argument("--save", help="store the results as a JSON baseline")
+    arguments.add_argument("--compare", help="compare against a JSON baseline")
+    arguments.add_argument("--threshold", type=float, default=0.1)
+    arguments.add_argument("--lexer-comparison", action="store_true")
+    args = arguments.parse_args()
+
+    if args.lexer_comparison:
+        bench_lexer()
+        sys.exit(0)
+
+    results = run_benchmarks(args.repeat, args.workload)
+    report(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from typing import Callable
+
+from interfaces import Node
+from lexer import lexer
+from parser import parser
+
+# The default number of parsed commands kept in the cache
+CACHE_SIZE = 1024
+
+
+def front_end(command: str) -> Node:
+    return parser(lexer(command))
+
+
+def normalize(command: str) -> str:
+    """
+    Reduces a command to a canonical form. Whitespace never belongs to a
+    token, so commands that only differ in spacing share the same AST.
+    """
+
+    return " ".join(command.split())
+
+
+class ParseCache:
+    """
+    A bounded LRU cache mapping the text of a command to its AST, so that
+    repeated commands skip the lexer and the parser. Commands that fail to
+    parse are not cached.
+
+    The `front_end` function turns a command into its AST, and may run further
+    passes over the tree, like the optimizer.
+    """
+
+    def __init__(
+        self,
+        size: int = CACHE_SIZE,
+        front_end: Callable[[str], Node] = front_end,
+    ) -> None:
+        if size < 1:
+            raise ValueError("cache size must be positive")
+
+        self.size = size
+        self.front_end = front_end
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, Node] = OrderedDict()
+
+    def parse(
+        self, command: str, front_end: Callable[[str], Node] | None = None
+    ) -> Node:
+        """
+        :param command str: the command to be parsed
+        :param front_end Callable: replaces the front end of the cache for
+                                   this command, e.g. to parse tokens that
+                                   were already lexed
+        :return Node: the AST of the command, shared between calls
+        :raises: Error if the command is invalid
+        """
+
+        key = normalize(command)
+        ast = self._entries.get(key)
+
+        if ast is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return ast
+
+        self.misses += 1
+        # the command is lexed as written, so errors point at its own columns
+        ast = (front_end or self.front_end)(command)
+        self._entries[key] = ast
+
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return ast
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,229 @@
+import operator
+from collections import OrderedDict
+from typing import Callable, TypeAlias
+
+from interfaces import Error, Node, NodeType, Operator, Environment
+from evaluator import evaluator
+from environment import SlotEnvironment, UNBOUND
+
+# A Compiled command is a closure that runs the command against an environment
+Compiled: TypeAlias = Callable[[Environment], int | float | None]
+
+# The number of times a command is interpreted before it gets compiled
+HOT_THRESHOLD = 8
+
+# The number of compiled commands kept, and of cold commands whose runs are
+# counted, the least recently run are dropped first
+COMPILED_SIZE = 1024
+COUNTS_SIZE = 4096
+
+_OPERATIONS = {
+    Operator.ADD: operator.add,
+    Operator.SUBTRACT: operator.sub,
+    Operator.MULTIPLY: operator.mul,
+    Operator.MODULO: operator.mod,
+}
+
+
+def compiler(ast: Node, slots: SlotEnvironment | None = None) -> Compiled:
+    """
+    Lowers an AST into a chain of closures. Literals are converted once and
+    operators are bound directly, so running the result skips the tree walk
+    done by the evaluator. The closures keep the semantics of the evaluator.
+
+    With `slots`, variables are resolved to their slots in that environment
+    while compiling, reserving slots for the variables it doesn't define
+    yet, so the result must be run against that environment.
+
+    :param ast Node: the abstract syntax tree to be compiled
+    :param slots SlotEnvironment | None: the environment to access variables
+                                         of by slot
+    :return Compiled: a function taking the environment and returning the
+                      result of the operation
+    """
+
+    try:
+        match ast.node_type:
+            case NodeType.EXPRESSION | NodeType.TERM | NodeType.FACTOR:
+                return _compile_expression(ast, slots)
+            case NodeType.ASSIGNMENT:
+                return _compile_assignment(str(ast.value), ast.children[0], slots)
+    except RecursionError:
+        pass  # too deeply nested for closures, the evaluator has no limit
+    except Error:
+        # incomplete, the evaluator reports it only once the operands on its
+        # left have run, so it must not fail at compile time
+        pass
+
+    # commands with side effects are rare enough to be interpreted
+    return lambda env: evaluator(ast, env)
+
+
+def _compile_expression(ast: Node, slots: SlotEnvironment | None) -> Compiled:
+    if not ast:
+        raise Error("Cannot evaluate expression")
+
+    if ast.op is not None:
+        left = _compile_expression(ast.children[0], slots)
+        right = _compile_expression(ast.children[1], slots)
+        return _compile_binary(ast.op, left, right)
+
+    return _compile_factor(ast, slots)
+
+
+def _compile_binary(op: Operator, left: Compiled, right: Compiled) -> Compiled:
+    verb = op.name.lower()
+
+    if op == Operator.DIVIDE:
+
+        def divide(env: Environment) -> int | float:
+            op1 = left(env)
+            op2 = right(env)
+
+            if type(op1) != type(op2):
+                raise Error(f"Cannot {verb} {type(op1)} to {type(op2)}. Type mismatch.")
+
+            if type(op1) == int:
+                return op1 // op2
+            return op1 / op2
+
+        return divide
+
+    operation = _OPERATIONS[op]
+
+    def binary(env: Environment) -> int | float:
+        op1 = left(env)
+        op2 = right(env)
+
+        if type(op1) != type(op2):
+            raise Error(f"Cannot {verb} {type(op1)} to {type(op2)}. Type mismatch.")
+
+        return operation(op1, op2)
+
+    return binary
+
+
+def _compile_factor(ast: Node, slots: SlotEnvironment | None) -> Compiled:
+    literal = ast.number
+
+    if literal is not None:
+        return lambda env: literal
+
+    val = str(ast.value)
+
+    if val == "None":
+        return _compile_expression(ast.children[0], slots)
+
+    if val[0] == "-":
+        load = _compile_load(val[1:], slots)
+        return lambda env: -load(env)
+    return _compile_load(val, slots)
+
+
+def _compile_load(name: str, slots: SlotEnvironment | None) -> Compiled:
+    if slots is None:
+        return lambda env: env[name]
+
+    values = slots.values
+    index = slots.slot(name)
+
+    def load(env: SlotEnvironment) -> int | float:
+        value = values[index]
+
+        if value is UNBOUND:
+            raise KeyError(name)
+        return value
+
+    return load
+
+
+def _compile_assignment(
+    variable: str, value: Node, slots: SlotEnvironment | None
+) -> Compiled:
+    expression = _compile_expression(value, slots)
+
+    if slots is not None:
+        values = slots.values
+        index = slots.slot(variable)
+
+        def assign_slot(env: SlotEnvironment) -> None:
+            res = expression(env)
+            try:
+                res = int(res)
+            except ValueError:
+                res = float(res)
+
+            if values[index] is UNBOUND:
+                slots.size += 1
+            values[index] = res
+
+        return assign_slot
+
+    def assign(env: Environment) -> None:
+        res = expression(env)
+        try:
+            env[variable] = int(res)
+        except ValueError:
+            env[variable] = float(res)
+
+    return assign
+
+
+class TieredEvaluator:
+    """
+    Interprets commands with the evaluator until they have run more than
+    `threshold` times, then switches to their compiled form. Commands are
+    identified by a key, usually their source text.
+
+    Commands run against a `SlotEnvironment` are compiled against it, to
+    access its variables by slot, and are recompiled if later run against
+    another mapping.
+
+    At most `size` compiled commands and `counts_size` cold commands are
+    kept, so that a long running process, or a script of unique lines, runs
+    in constant memory. The least recently run are dropped first.
+    """
+
+    def __init__(
+        self,
+        threshold: int = HOT_THRESHOLD,
+        size: int = COMPILED_SIZE,
+        counts_size: int = COUNTS_SIZE,
+    ) -> None:
+        self.threshold = threshold
+        self.size = size
+        self.counts_size = counts_size
+        self.counts: OrderedDict[str, int] = OrderedDict()
+        # a dict keeps its keys in insertion order, and moving a key to the end
+        # by reinserting it is cheaper than with an OrderedDict
+        self.compiled: dict[str, tuple[SlotEnvironment | None, Compiled]] = {}
+
+    def __call__(self, key: str, ast: Node, env: Environment):
+        slots = env if type(env) is SlotEnvironment else None
+        entry = self.compiled.pop(key, None)
+
+        if entry:
+            self.compiled[key] = entry
+            if entry[0] is slots:
+                return entry[1](env)
+            return self._compile(key, ast, slots)(env)
+
+        count = self.counts.pop(key, 0) + 1
+
+        if count > self.threshold:
+            return self._compile(key, ast, slots)(env)
+
+        self.counts[key] = count
+        if len(self.counts) > self.counts_size:
+            self.counts.popitem(last=False)
+
+        return evaluator(ast, env)
+
+    def _compile(self, key: str, ast: Node, slots: SlotEnvironment | None) -> Compiled:
+        compiled = compiler(ast, slots)
+        self.compiled[key] = (slots, compiled)
+
+        if len(self.compiled) > self.size:
+            del self.compiled[next(iter(self.compiled))]
+
+        return compiled
@@ -0,0 +1,456 @@
+"""
+Differential testing of the interpreter's engines against the reference.
+
+    python conformance.py --programs 200000 --workers 8
+    python conformance.py --engine vm --seed 7
+
+Random programs are generated from the grammar in `interfaces.py`, and run by
+the reference engine, a frozen copy of the original lexer, parser and
+evaluator in `reference.py`, and by every engine of the interpreter, starting
+with its own lexer, parser and evaluator. The output, the errors and their lines, and the final
+variables of each engine must match the reference. Programs that don't are
+shrunk to a minimal reproduction before being reported.
+
+Every program is generated from the seed and its index, so a failure can be
+reproduced alone with `generate(random.Random(program_seed(seed, index)))`.
+"""
+
+import argparse
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, TypeAlias
+
+import inputs
+import output
+import reference as baseline
+import vm
+from dataflow import optimize_script
+from cache import ParseCache
+from compiler import TieredEvaluator, compiler
+from environment import ForkableEnvironment, SlotEnvironment
+from evaluator import evaluator
+from interfaces import Environment, Error
+from lexer import lexer
+from optimizer import optimizer
+from parser import parser
+
+# A program is the lines of a script and the values read by its BEG commands
+Case: TypeAlias = tuple[list[str], list[int | float]]
+
+# What a program did: its output and errors in order, and its final variables
+Event: TypeAlias = tuple
+Trace: TypeAlias = tuple[list[Event], list[tuple[str, str, str]]]
+
+# An engine runs the lines of a program, recording its errors as events, and
+# returns the environment it ran in
+Engine: TypeAlias = Callable[[list[str], list[Event]], Environment]
+
+
+# ########################################################################
+# Generation, weighted by the productions of the grammar
+
+
+COMMANDS = {
+    "assignment": 8,
+    "expression": 3,
+    "output": 3,
+    "beg": 1,
+    "exit": 0.2,
+    # token soup, for the errors of the lexer and the parser
+    "invalid": 1,
+}
+FACTORS = {"int": 4, "float": 2, "variable": 5, "negative": 1, "parentheses": 2}
+VARIABLES = ["a", "b", "c", "x1", "inf", "nan"]
+INVALID_TOKENS = [
+    "a",
+    "1",
+    "2.5",
+    "+",
+    "-",
+    "*",
+    "/",
+    "%",
+    "(",
+    ")",
+    "=",
+    "BEG",
+    "PRINT",
+    "EXIT!",
+]
+
+
+def _choose(rng: random.Random, weights: dict[str, float]) -> str:
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _variable(rng: random.Random) -> str:
+    # most programs stick to a few variables, so they are often defined
+    return rng.choice(VARIABLES[:4] if rng.random() < 0.95 else VARIABLES)
+
+
+def _number(rng: random.Random, kind: str) -> str:
+    digits = str(rng.choice([0, 1, 2, 3, 7, 10, rng.randrange(10**6)]))
+    if kind == "int":
+        return digits
+    return f"{digits}.{rng.choice(['', '0', '5', '25', '75'])}"
+
+
+def _expression(rng: random.Random, depth: int) -> list[str]:
+    tokens = _term(rng, depth)
+
+    while rng.random() < 0.45:
+        # runs of signs exercise the folding of `+` and `-`
+        tokens.append(rng.choice("+-"))
+        while rng.random() < 0.1:
+            tokens.append(rng.choice("+-"))
+        tokens += _term(rng, depth)
+
+    return tokens
+
+
+def _term(rng: random.Random, depth: int) -> list[str]:
+    tokens = _factor(rng, depth)
+
+    while rng.random() < 0.35:
+        tokens.append(rng.choice("*/%"))
+        tokens += _factor(rng, depth)
+
+    return tokens
+
+
+def _factor(rng: random.Random, depth: int) -> list[str]:
+    kind = _choose(rng, FACTORS)
+
+    if kind == "parentheses" and depth > 0:
+        return ["(", *_expression(rng, depth - 1), ")"]
+    if kind == "negative":
+        sign = rng.choice("+-")
+        if rng.random() < 0.5:
+            return [sign, _variable(rng)]
+        return [sign, _number(rng, rng.choice(["int", "float"]))]
+    if kind == "variable":
+        return [_variable(rng)]
+    return [_number(rng, "float" if kind == "float" else "int")]
+
+
+def _command(rng: random.Random) -> list[str]:
+    match _choose(rng, COMMANDS):
+        case "assignment":
+            return [_variable(rng), "=", *_expression(rng, 2)]
+        case "expression":
+            return _expression(rng, 2)
+        case "output":
+            if rng.random() < 0.7:
+                return ["PRINT", _variable(rng)]
+            return ["PRINT", _number(rng, rng.choice(["int", "float"]))]
+        case "beg":
+            return ["BEG", _variable(rng)]
+        case "exit":
+            return ["EXIT!"]
+        case _:
+            return [rng.choice(INVALID_TOKENS) for _ in range(rng.randint(1, 6))]
+
+
+def generate(rng: random.Random, lines: int = 8) -> Case:
+    """
+    :return Case: a program of up to `lines` commands, and the values of its
+                  BEG commands, which sometimes run out
+    """
+
+    program: list[str] = []
+
+    for _ in range(rng.randint(1, lines)):
+        if program and rng.random() < 0.15:
+            program.append(rng.choice(program))
+        else:
+            program.append(" ".join(_command(rng)))
+
+    values: list[int | float] = [
+        rng.choice([0, 1, 5, -3, 2.5, 0.0, -1.5]) for _ in range(rng.randint(0, 3))
+    ]
+    return program, values
+
+
+def program_seed(seed: int, index: int) -> int:
+    return seed * 1_000_003 + index
+
+
+# ########################################################################
+# Engines
+
+
+def _line_engine(
+    run_line: Callable[[str, Environment], object],
+    environment: Callable[[], Environment] = dict,
+) -> Engine:
+    """
+    Builds an engine that runs a program one line at a time, like
+    `main.run_script`, but recording every exception.
+    """
+
+    def engine(lines: list[str], events: list[Event]) -> Environment:
+        env = environment()
+
+        for lineno, line in enumerate(lines, start=1):
+            command = line.strip()
+            if not command:
+                continue
+
+            try:
+                run_line(command, env)
+            except SystemExit:
+                events.append(("exit", lineno))
+                break
+            except Exception as e:
+                events.append(("error", lineno, type(e).__name__))
+
+        return env
+
+    return engine
+
+
+def _front_end(command: str):
+    return optimizer(parser(lexer(command)))
+
+
+def _tiered_engine(lines: list[str], events: list[Event]) -> Environment:
+    # repeated lines go through the cache, and get compiled
+    cache = ParseCache(front_end=_front_end)
+    execute = TieredEvaluator(threshold=1)
+
+    def run_line(command: str, env: Environment):
+        execute(command, cache.parse(command), env)
+
+    return _line_engine(run_line, SlotEnvironment)(lines, events)
+
+
+def _vm_engine(lines: list[str], events: list[Event]) -> Environment:
+    env: Environment = {}
+    program = vm.compile_script(lines)
+
+    for lineno, code in program.lines:
+        try:
+            if vm._execute(code, program.consts, program.names, env):
+                events.append(("exit", lineno))
+                break
+        except Exception as e:
+            events.append(("error", lineno, type(e).__name__))
+
+    return env
+
+
+def _dataflow_engine(lines: list[str], events: list[Event]) -> Environment:
+    env: Environment = {}
+    statements, _ = optimize_script(lines, _front_end)
+
+    for lineno, command, ast, _ in statements:
+        try:
+            evaluator(_front_end(command) if ast is None else ast, env)
+        except SystemExit:
+            events.append(("exit", lineno))
+            break
+        except Exception as e:
+            events.append(("error", lineno, type(e).__name__))
+
+    return env
+
+
+def _forked() -> ForkableEnvironment:
+    # an empty environment over layers of deleted variables
+    base = ForkableEnvironment({"a": 1, "x1": 2})
+    env = base.fork()
+    del env["a"], env["x1"]
+    return env.fork()
+
+
+def reference(command: str, env: Environment):
+    try:
+        ast = baseline.parser(baseline.lexer(command))
+    except IndexError:
+        # the original parser reads past the end of incomplete commands,
+        # which the interpreter reports as invalid
+        raise Error("Invalid command")
+
+    baseline.evaluator(ast, env)
+
+
+def _interpret(command: str, env: Environment):
+    evaluator(parser(lexer(command)), env)
+
+
+ENGINES: dict[str, Engine] = {
+    "evaluator": _line_engine(_interpret),
+    "optimizer": _line_engine(lambda command, env: evaluator(_front_end(command), env)),
+    "compiler": _line_engine(lambda command, env: compiler(_front_end(command))(env)),
+    "slots": _line_engine(
+        lambda command, env: compiler(_front_end(command), env)(env), SlotEnvironment
+    ),
+    "tiered": _tiered_engine,
+    "vm": _vm_engine,
+    "fork": _line_engine(_interpret, _forked),
+    "dataflow": _dataflow_engine,
+}
+REFERENCE: Engine = _line_engine(reference)
+
+
+class _Recorder:
+    """
+    A stream recording every write as an output event.
+    """
+
+    def __init__(self, events: list[Event]) -> None:
+        self.events = events
+
+    def write(self, text: str):
+        self.events.append(("output", text))
+
+    def flush(self):
+        pass
+
+
+def trace(engine: Engine, case: Case) -> Trace:
+    lines, values = case
+    events: list[Event] = []
+
+    previous_output = output.set_output(output.Output(_Recorder(events)))
+    previous_inputs = inputs.set_provider(inputs.SequenceInputs(values))
+
+    try:
+        env = engine(lines, events)
+    finally:
+        output.set_output(previous_output)
+        inputs.set_provider(previous_inputs)
+
+    variables = sorted(
+        (name, type(value).__name__, repr(value)) for name, value in env.items()
+    )
+    return events, variables
+
+
+def differs(engine: Engine, case: Case) -> bool:
+    return trace(engine, case) != trace(REFERENCE, case)
+
+
+# ########################################################################
+# Shrinking
+
+
+def shrink(engine: Engine, case: Case) -> Case:
+    """
+    Reduces a program the engine disagrees on, by removing lines, tokens and
+    values, and simplifying numbers, for as long as the engine still
+    disagrees with the reference.
+
+    :return Case: a program that cannot be reduced any further
+    """
+
+    lines, values = list(case[0]), list(case[1])
+    changed = True
+
+    while changed:
+        changed = False
+
+        for candidate in _smaller(lines, values):
+            if differs(engine, candidate):
+                lines, values = candidate
+                changed = True
+                break
+
+    return lines, values
+
+
+def _smaller(lines: list[str], values: list):
+    # whole chunks of lines, then single lines
+    size = len(lines) // 2
+    while size >= 1:
+        for start in range(0, len(lines), size):
+            yield lines[:start] + lines[start + size :], values
+        size //= 2
+
+    for index in range(len(values)):
+        yield lines, values[:index] + values[index + 1 :]
+
+    for index, line in enumerate(lines):
+        tokens = line.split()
+
+        for position in range(len(tokens)):
+            smaller = tokens[:position] + tokens[position + 1 :]
+            yield lines[:index] + [" ".join(smaller)] + lines[index + 1 :], values
+
+        for position, token in enumerate(tokens):
+            if token[0].isdigit() and token not in ("0", "1"):
+                for simpler in ("0", "1"):
+                    simplified = tokens[:position] + [simpler] + tokens[position + 1 :]
+                    yield lines[:index] + [" ".join(simplified)] + lines[
+                        index + 1 :
+                    ], values
+
+
+# ########################################################################
+# Running
+
+
+def check(seed: int, start: int, count: int, engines: list[str]) -> list[tuple]:
+    """
+    Runs the programs `start` to `start + count` of a seed through the
+    engines.
+
+    :return list[tuple]: the index, engine name and shrunk program of every
+                         disagreement, at most one per engine
+    """
+
+    failures = []
+    remaining = list(engines)
+
+    for index in range(start, start + count):
+        case = generate(random.Random(program_seed(seed, index)))
+        expected = trace(REFERENCE, case)
+
+        for name in remaining:
+            if trace(ENGINES[name], case) != expected:
+                failures.append((index, name, shrink(ENGINES[name], case)))
+                remaining.remove(name)
+
+        if not remaining:
+            break
+
+    return failures
+
+
+def _check(arguments: tuple) -> list[tuple]:
+    return check(*arguments)
+
+
+def main():
+    arguments = argparse.ArgumentParser(description="Differential testing of engines")
+    arguments.add_argument("--programs", type=int, default=10_000)
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--engine", action="append", choices=list(ENGINES))
+    arguments.add_argument("-j", "--workers", type=int, default=1)
+    args = arguments.parse_args()
+
+    engines = args.engine or list(ENGINES)
+    chunk = -(-args.programs // args.workers)
+    tasks = [
+        (args.seed, start, min(chunk, args.programs - start), engines)
+        for start in range(0, args.programs, chunk)
+    ]
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        failures = [failure for result in pool.map(_check, tasks) for failure in result]
+
+    for index, name, (lines, values) in failures:
+        print(f"{name} disagrees with the reference on program {index}:")
+        for line in lines:
+            print(f"    {line}")
+        if values:
+            print(f"  with BEG values {values}")
+
+    if not failures:
+        print(f"{args.programs} programs, no disagreements in {', '.join(engines)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
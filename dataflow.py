@@ -0,0 +1,270 @@
+"""
+Dataflow optimization of a whole script.
+
+A forward pass propagates the values of the variables that are constant at
+each line into the expressions reading them, and folds the result with the
+optimizer. A backward pass then follows the def-use chains of the variables
+to drop dead stores: assignments whose value is overwritten before it is
+read, and expressions whose value is discarded.
+
+Only statements that cannot fail are dropped, so the errors of a script are
+reported as before. A statement that may end the script, like BEG at the end
+of its input, keeps every variable live. BEG and PRINT are kept as they are,
+and no line is moved.
+"""
+
+from collections.abc import Iterable
+from typing import Callable, NamedTuple
+
+from interfaces import Error, Node, NodeType, Operator
+from optimizer import optimizer
+
+# The positions of an operand, as in the evaluator
+_EXPRESSION, _TERM, _FACTOR = range(3)
+_POSITIONS = {NodeType.EXPRESSION: _EXPRESSION, NodeType.TERM: _TERM}
+
+# The operators that never fail on ints
+_TOTAL = (Operator.ADD, Operator.SUBTRACT, Operator.MULTIPLY)
+
+
+class Statement(NamedTuple):
+    """
+    A line of an optimized script. `ast` is None if the line doesn't parse,
+    and `rewritten` tells if it differs from the AST of the command.
+    """
+
+    lineno: int
+    command: str
+    ast: Node | None
+    rewritten: bool = False
+
+
+def optimize_script(
+    lines: Iterable[str], parse: Callable[[str], Node]
+) -> tuple[list[Statement], int]:
+    """
+    Variables are assumed to hold unknown values before the script runs.
+
+    :param lines Iterable[str]: the lines of the script
+    :param parse Callable: the front end turning a command into its AST
+    :return tuple: the statements left to run, and the number of statements
+                   eliminated
+    """
+
+    statements: list[Statement] = []
+    # what the backward pass needs: the variable a statement stores, whether
+    # it cannot fail, whether it may end the script, and the variables it reads
+    effects: list[tuple[str | None, bool, bool, set[str]]] = []
+
+    constants: dict[str, int | float] = {}
+    ints: set[str] = set()  # variables that hold an int, of unknown value
+
+    for lineno, line in enumerate(lines, start=1):
+        command = line.rstrip()  # indented, for the columns of errors
+        if not command:
+            continue
+
+        try:
+            ast = parse(command)
+        except Error:
+            statements.append(Statement(lineno, command, None))
+            effects.append((None, False, False, set()))
+            continue
+
+        match ast.node_type:
+            case NodeType.EXIT:
+                statements.append(Statement(lineno, command, ast))
+                effects.append((None, False, True, set()))
+                break  # the lines after it never run
+            case NodeType.BEG:
+                variable = str(ast.value)
+                constants.pop(variable, None)
+                ints.discard(variable)
+                statements.append(Statement(lineno, command, ast))
+                effects.append((variable, False, True, set()))
+                continue
+            case NodeType.OUTPUT:
+                used = {str(ast.children[0])} if ast.value == "VARIABLE" else set()
+                statements.append(Statement(lineno, command, ast))
+                effects.append((None, False, False, used))
+                continue
+            case NodeType.ASSIGNMENT:
+                variable = str(ast.value)
+                expression = ast.children[0]
+                position = _EXPRESSION
+            case _:
+                variable = None
+                expression = ast
+                position = _POSITIONS.get(ast.node_type, _FACTOR)
+
+        ends = False
+
+        try:
+            folded = _propagate(expression, constants)
+            if folded is not expression:
+                # a mismatch is left for the evaluator to report
+                folded = _fold(folded, variable) or expression
+            value = _constant(folded)
+            certain = value is not None or _certain(folded, position, ints)
+            used = _reads(folded)
+        except RecursionError:
+            # too deeply nested to be analyzed, kept as an opaque statement
+            folded, value, certain, used = expression, None, False, set()
+            ends = True
+
+        if variable is not None:
+            constants.pop(variable, None)
+            ints.discard(variable)
+
+            if value is not None:
+                constants[variable] = value
+            if certain and type(value) != float:
+                ints.add(variable)
+
+        if folded is expression:
+            statements.append(Statement(lineno, command, ast))
+        elif variable is None:
+            statements.append(Statement(lineno, command, folded, True))
+        else:
+            rewritten = Node(variable, NodeType.ASSIGNMENT, [folded])
+            statements.append(Statement(lineno, command, rewritten, True))
+        effects.append((variable, certain, ends, used))
+
+    return _eliminate(statements, effects)
+
+
+def _eliminate(
+    statements: list[Statement], effects: list[tuple[str | None, bool, bool, set[str]]]
+) -> tuple[list[Statement], int]:
+    kept: list[Statement] = []
+    # variables overwritten before being read, from the current statement on
+    dead: set[str] = set()
+
+    for statement, (variable, certain, ends, used) in zip(
+        reversed(statements), reversed(effects)
+    ):
+        if certain and (variable is None or variable in dead):
+            continue
+
+        if ends:
+            dead.clear()
+        elif variable is not None and certain:
+            dead.add(variable)
+        elif variable is not None:
+            # on failure, the variable keeps its previous value
+            dead.discard(variable)
+
+        dead -= used
+        kept.append(statement)
+
+    kept.reverse()
+    return kept, len(statements) - len(kept)
+
+
+def _propagate(ast: Node | None, constants: dict[str, int | float]) -> Node | None:
+    """
+    :return Node: the expression with the constant variables replaced by
+                  their value, the same node if nothing was replaced
+    """
+
+    if ast is None or ast.number is not None:
+        return ast
+
+    if ast.children:
+        children = [_propagate(child, constants) for child in ast.children]
+        if all(new is old for new, old in zip(children, ast.children)):
+            return ast
+        return Node(ast.value, ast.node_type, children)
+
+    val = str(ast.value)
+    name = val.removeprefix("-")
+
+    if name not in constants:
+        return ast
+
+    value = -constants[name] if name != val else constants[name]
+    return Node(str(value), NodeType.FACTOR, number=value)
+
+
+def _fold(ast: Node | None, variable: str | None) -> Node | None:
+    """
+    :return Node: the folded expression, None if it fails on a type mismatch
+                  between the constants
+    """
+
+    try:
+        if variable is None:
+            return optimizer(ast)
+        return optimizer(Node(variable, NodeType.ASSIGNMENT, [ast])).children[0]
+    except Error:
+        return None
+
+
+def _constant(ast: Node | None) -> int | float | None:
+    """
+    :return: the value an assignment of the expression stores, if it is a
+             literal that can be stored and written back
+    """
+
+    if ast is None or ast.number is None:
+        return None
+
+    try:
+        value = int(ast.number)
+    except ValueError:
+        value = float(ast.number)
+    except OverflowError:
+        return None  # fails to be stored
+
+    try:
+        str(value)
+    except ValueError:
+        return None  # too many digits to be written as a literal
+    return value
+
+
+def _certain(ast: Node | None, position: int, ints: set[str]) -> bool:
+    """
+    Checks if an expression evaluates to an int without failing: every
+    operand is an int, every operator is applied in its position, and no
+    operator can divide by zero.
+    """
+
+    if ast is None:
+        return False
+
+    if ast.number is not None:
+        return type(ast.number) == int
+
+    op = ast.op
+
+    if op is not None:
+        right = _TERM if op <= Operator.SUBTRACT else _FACTOR
+        return (
+            position < right
+            and op in _TOTAL
+            and _certain(ast.children[0], right - 1, ints)
+            and _certain(ast.children[1], right, ints)
+        )
+
+    val = str(ast.value)
+
+    if val == "None":
+        return _certain(ast.children[0], _EXPRESSION, ints)
+    return val.removeprefix("-") in ints
+
+
+def _reads(ast: Node | None) -> set[str]:
+    names = set()
+    stack = [ast]
+
+    while stack:
+        node = stack.pop()
+        if node is None or node.number is not None:
+            continue
+        if node.children:
+            stack.extend(node.children)
+        else:
+            names.add(str(node.value).removeprefix("-"))
+
+    return names
@@ -0,0 +1,221 @@
+from collections.abc import Iterable, Iterator, MutableMapping
+from typing import NamedTuple
+
+# Marks the variables deleted from a layer of a ForkableEnvironment, and the
+# slots of a SlotEnvironment that hold no variable
+UNBOUND = object()
+
+# The number of layers a chain of forks grows to before its layers are merged
+MAX_LAYERS = 16
+
+
+class SlotEnvironment(MutableMapping):
+    """
+    An environment that stores its variables in a list indexed by slot, so
+    compiled code can access them without hashing their names. It can still
+    be used as a dictionary of names to values.
+
+    Every environment gives its variables their own slots, in the order they
+    are first defined or compiled against it. A slot is never given to
+    another variable, deleting a variable only marks its slot as UNBOUND, so
+    code compiled against the environment stays valid for its lifetime.
+    """
+
+    __slots__ = ("slots", "values", "size")
+
+    def __init__(self, variables: Iterable | None = None) -> None:
+        self.slots: dict[str, int] = {}
+        self.values: list = []
+        self.size = 0
+        if variables:
+            self.update(variables)
+
+    def slot(self, name: str) -> int:
+        """
+        :param name str: the name of the variable
+        :return int: the slot of the variable, reserved as UNBOUND if the
+                     variable has none yet
+        """
+
+        index = self.slots.get(name)
+
+        if index is None:
+            index = self.slots[name] = len(self.values)
+            self.values.append(UNBOUND)
+        return index
+
+    def __getitem__(self, name: str) -> int | float:
+        value = self.values[self.slots[name]]
+
+        if value is UNBOUND:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value: int | float) -> None:
+        index = self.slot(name)
+
+        if self.values[index] is UNBOUND:
+            self.size += 1
+        self.values[index] = value
+
+    def __delitem__(self, name: str) -> None:
+        self[name]  # raises KeyError if the variable is not defined
+        self.values[self.slots[name]] = UNBOUND
+        self.size -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        values = self.values
+        return (
+            name for name, index in self.slots.items() if values[index] is not UNBOUND
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"SlotEnvironment({dict(self)})"
+
+
+class _Layer(NamedTuple):
+    variables: dict
+    parent: "_Layer | None"
+    depth: int
+    # the number of variables defined in the chain down from this layer
+    size: int
+
+
+class ForkableEnvironment(MutableMapping):
+    """
+    An environment that forks in constant time, so that many variants of a
+    program can run against the same variables without copying them.
+
+    Variables are stored in a chain of layers, the newest first. A fork
+    freezes the layer written so far and shares it with the new environment,
+    then both write to a layer of their own, so shared layers are never
+    modified. Deleting a shared variable marks it as UNBOUND in the newest
+    layer.
+
+    The number of variables is kept up to date as they are defined and
+    deleted, so its length doesn't depend on the size of the shared layers.
+    """
+
+    __slots__ = ("variables", "shared", "size")
+
+    def __init__(self, variables: Iterable | None = None) -> None:
+        self.variables: dict = {}
+        self.shared: _Layer | None = None
+        self.size = 0
+        if variables:
+            self.update(variables)
+
+    def fork(self) -> "ForkableEnvironment":
+        """
+        :return ForkableEnvironment: an environment with the same variables,
+                                     where writes don't affect this one
+        """
+
+        if self.variables:
+            depth = self.shared.depth + 1 if self.shared else 1
+            self.shared = _Layer(self.variables, self.shared, depth, self.size)
+            self.variables = {}
+
+            if depth > MAX_LAYERS:
+                self.shared = _merge(self.shared)
+
+        fork = ForkableEnvironment()
+        fork.shared = self.shared
+        fork.size = self.size
+        return fork
+
+    def __getitem__(self, name: str) -> int | float:
+        # values are numbers, so None means the layer doesn't have the name
+        value = self.variables.get(name)
+
+        if value is None:
+            value = _find(self.shared, name)
+
+        if value is None or value is UNBOUND:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value: int | float) -> None:
+        previous = self.variables.get(name)
+
+        if previous is None:
+            previous = _find(self.shared, name)
+        if previous is None or previous is UNBOUND:
+            self.size += 1
+
+        self.variables[name] = value
+
+    def __delitem__(self, name: str) -> None:
+        self[name]  # raises KeyError if the variable is not defined
+        self.size -= 1
+
+        if self.shared is None:
+            del self.variables[name]
+        else:
+            self.variables[name] = UNBOUND
+
+    def __iter__(self) -> Iterator[str]:
+        # only the newest layer may change while iterating
+        layers = [list(self.variables.items())]
+        layer = self.shared
+
+        while layer is not None:
+            layers.append(layer.variables.items())
+            layer = layer.parent
+
+        oldest = layers.pop()
+        seen = set()
+
+        for items in layers:
+            for name, value in items:
+                if name not in seen:
+                    seen.add(name)
+                    if value is not UNBOUND:
+                        yield name
+
+        for name, value in oldest:
+            if name not in seen and value is not UNBOUND:
+                yield name
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"ForkableEnvironment({dict(self)})"
+
+
+def _find(layer: _Layer | None, name: str) -> int | float | object | None:
+    """
+    :return: the value of the name in the newest layer of the chain that has
+             it, which may be UNBOUND, None if no layer has it
+    """
+
+    while layer is not None:
+        value = layer.variables.get(name)
+        if value is not None:
+            return value
+        layer = layer.parent
+
+    return None
+
+
+def _merge(layer: _Layer) -> _Layer:
+    """
+    Merges the layers of a chain into one, above the oldest layer, which is
+    usually the large base every fork shares and is left as it is.
+    """
+
+    size = layer.size
+    layers = []
+    while layer.parent is not None:
+        layers.append(layer.variables)
+        layer = layer.parent
+
+    merged: dict = {}
+    for variables in reversed(layers):
+        merged.update(variables)
+
+    return _Layer(merged, layer, 2, size)
@@ -1,4 +1,6 @@
-from interfaces import Error, Node, Environment
+from interfaces import Error, Node, NodeType, Operator, Environment
+import inputs
+import output
 
 
 def evaluator(ast: Node, env: Environment):
@@ -9,103 +11,110 @@ def evaluator(ast: Node, env: Environment):
     """
 
     match ast.node_type:
-        case "EXIT":
+        case NodeType.EXIT:
             return _evaluate_exit()
-        case "BEG":
+        case NodeType.BEG:
             return _evaluate_beg(str(ast.value), env)
-        case "OUTPUT":
+        case NodeType.OUTPUT:
             return _evaluate_output(str(ast.value), ast.children[0], env)
-        case "EXPRESSION":
+        case NodeType.EXPRESSION:
             return _evaluate_expression(ast, env)
-        case "TERM":
+        case NodeType.TERM:
             return _evaluate_term(ast, env)
-        case "FACTOR":
+        case NodeType.FACTOR:
             return _evaluate_factor(ast, env)
-        case "ASSIGNMENT":
+        case NodeType.ASSIGNMENT:
             return _evaluate_assignment(str(ast.value), ast.children[0], env)
 
 
-def _evaluate_expression(ast: Node, env: Environment) -> int | float:
-    if not ast:
-        raise Error("Cannot evaluate expression")
+# The positions an operand can take, named after the production the
+# evaluator expects there
+_EXPRESSION, _TERM, _FACTOR = range(3)
+_APPLY = -1
+_KINDS = ("expression", "term", "factor")
 
-    match ast.value:
-        case "+":
-            op1 = _evaluate_expression(ast.children[0], env)
-            op2 = _evaluate_term(ast.children[1], env)
 
-            if type(op1) != type(op2):
-                raise Error(f"Cannot add {type(op1)} to {type(op2)}. Type mismatch.")
-
-            return op1 + op2
-        case "-":
-            op1 = _evaluate_expression(ast.children[0], env)
-            op2 = _evaluate_term(ast.children[1], env)
+def _evaluate_expression(
+    ast: Node | None, env: Environment, position: int = _EXPRESSION
+) -> int | float:
+    """
+    Evaluates an expression in post-order with an explicit stack instead of
+    recursion, so that expressions of any depth can be evaluated.
 
-            if type(op1) != type(op2):
-                raise Error(
-                    f"Cannot subtract {type(op1)} to {type(op2)}. Type mismatch."
-                )
+    Operators are only applied in the position of their production, where a
+    term may take the place of an expression, and a factor that of a term.
 
-            return op1 - op2
-        case _:
-            return _evaluate_term(ast, env)
+    :param position int: the production expected of the root
+    """
 
+    work: list = [(ast, position)]
+    take = work.pop
+    values: list[int | float] = []
+    push = values.append
+    pop = values.pop
 
-def _evaluate_term(ast: Node, env: Environment) -> int | float:
-    if not ast:
-        raise Error("Cannot evaluate term")
+    while work:
+        ast, position = take()
 
-    match ast.value:
-        case "*":
-            op1 = _evaluate_term(ast.children[0], env)
-            op2 = _evaluate_factor(ast.children[1], env)
+        if position == _APPLY:
+            op2 = pop()
+            op1 = pop()
 
             if type(op1) != type(op2):
                 raise Error(
-                    f"Cannot multiply {type(op1)} to {type(op2)}. Type mismatch."
+                    f"Cannot {ast.name.lower()} {type(op1)} to {type(op2)}."
+                    " Type mismatch."
                 )
 
-            return op1 * op2
-        case "/":
-            op1 = _evaluate_term(ast.children[0], env)
-            op2 = _evaluate_factor(ast.children[1], env)
+            match ast:
+                case Operator.ADD:
+                    push(op1 + op2)
+                case Operator.SUBTRACT:
+                    push(op1 - op2)
+                case Operator.MULTIPLY:
+                    push(op1 * op2)
+                case Operator.DIVIDE:
+                    push(op1 // op2 if type(op1) == type(0) else op1 / op2)
+                case Operator.MODULO:
+                    push(op1 % op2)
+            continue
+
+        if not ast:
+            raise Error(f"Cannot evaluate {_KINDS[position]}")
+
+        if ast.number is not None:
+            push(ast.number)
+            continue
+
+        op = ast.op
+
+        if op is not None:
+            # the right operand is one production below the operator
+            right = _TERM if op <= Operator.SUBTRACT else _FACTOR
+            if position < right:
+                work.append((op, _APPLY))
+                work.append((ast.children[1], right))
+                work.append((ast.children[0], right - 1))
+                continue
+
+        val = str(ast.value)
+
+        if val == "None":
+            work.append((ast.children[0], _EXPRESSION))
+        elif val[0] == "-":
+            push(-env[val[1:]])
+        else:
+            push(env[val])
+
+    return values[0]
 
-            if type(op1) != type(op2):
-                raise Error(f"Cannot divide {type(op1)} to {type(op2)}. Type mismatch.")
-
-            if type(op1) == type(0):
-                return op1 // op2
-            return op1 / op2
-        case "%":
-            op1 = _evaluate_term(ast.children[0], env)
-            op2 = _evaluate_factor(ast.children[1], env)
 
-            if type(op1) != type(op2):
-                raise Error(f"Cannot modulo {type(op1)} to {type(op2)}. Type mismatch.")
-
-            return op1 % op2
-        case _:
-            return _evaluate_factor(ast, env)
+def _evaluate_term(ast: Node, env: Environment) -> int | float:
+    return _evaluate_expression(ast, env, _TERM)
 
 
 def _evaluate_factor(ast: Node, env: Environment) -> int | float:
-    if not ast:
-        raise Error("Cannot evaluate factor")
-
-    val = str(ast.value)
-
-    try:
-        return int(str(val))
-    except ValueError:
-        try:
-            return float(str(val))
-        except ValueError:
-            if val == "None":
-                return _evaluate_expression(ast.children[0], env)
-            if val[0] == "-":
-                return -env[val[1:]]
-            return env[val]
+    return _evaluate_expression(ast, env, _FACTOR)
 
 
 def _evaluate_assignment(variable: str, value: Node, env: Environment):
@@ -119,22 +128,16 @@ def _evaluate_assignment(variable: str, value: Node, env: Environment):
 
 def _evaluate_output(output_type: str, value: str, env: Environment):
     if output_type == "VARIABLE":
-        print(env[value])
+        output.write(str(env[value]))
         return
-    print(value)
+    output.write(str(value))
 
 
 def _evaluate_beg(variable: str, env: Environment):
-    value = input(f"\nProvide a value for variable {variable} >> ")
-
-    try:
-        value = int(value)
-    except ValueError:
-        value = float(value)
-
-    env[variable] = value
+    env[variable] = inputs.read(variable)
 
 
 def _evaluate_exit():
-    print("\nExiting SNOL Program...")
+    output.write("\nExiting SNOL Program...")
+    output.flush()
     exit(0)
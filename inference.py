@@ -0,0 +1,126 @@
+"""
+Static inference of the int and float types of a SNOL script.
+
+SNOL has no control flow, so the type of every variable is known at each line
+of a script from the assignments before it:
+
+- an expression of ints or of floats has the type of its operands
+- an assignment of an int expression always gives an int, but a float
+  expression gives a float when it is NaN, so its type is unknown
+- BEG, and variables that were bound before the script, are unknown
+
+The types are used to emit operations without a type check, see `vm.py`, and
+to report the type mismatches that are certain before running a script.
+"""
+
+from collections.abc import Iterable, Mapping
+from typing import Callable, TypeAlias
+
+from interfaces import Error, Node, NodeType
+
+# The static type of an expression, None when it is only known at runtime
+Type: TypeAlias = type | None
+
+
+def infer(
+    ast: Node | None, types: Mapping[str, Type], mismatches: list[str] | None = None
+) -> Type:
+    """
+    :param ast Node: an expression
+    :param types Mapping: the types of the variables, see `assign`
+    :param mismatches list: collects the type mismatches that are certain
+    :return Type: the type of the expression if it evaluates successfully
+    """
+
+    if ast is None:
+        return None
+
+    if ast.op is not None:
+        left = infer(ast.children[0], types, mismatches)
+        right = infer(ast.children[1], types, mismatches)
+
+        if left and right and left != right:
+            if mismatches is not None:
+                mismatches.append(
+                    f"Cannot {ast.op.name.lower()} {left} to {right}. Type mismatch."
+                )
+            return None
+
+        # a successful operation has the type of both of its operands
+        return left or right
+
+    if ast.number is not None:
+        return type(ast.number)
+
+    val = str(ast.value)
+
+    if val == "None":
+        return infer(ast.children[0], types, mismatches)
+    return types.get(val.removeprefix("-"))
+
+
+def assign(types: dict[str, Type], ast: Node):
+    """
+    Updates the types of the variables with the effect of a command. A
+    command may fail, leaving its variable unchanged, so a variable keeps a
+    known type only if the command cannot change it.
+    """
+
+    match ast.node_type:
+        case NodeType.ASSIGNMENT:
+            variable = str(ast.value)
+            try:
+                assigned = int if infer(ast.children[0], types) == int else None
+            except RecursionError:
+                assigned = None
+        case NodeType.BEG:
+            variable = str(ast.value)
+            assigned = None
+        case _:
+            return
+
+    if variable in types and types[variable] != assigned:
+        types[variable] = None
+    else:
+        types[variable] = assigned
+
+
+def check_script(
+    lines: Iterable[str], parse: Callable[[str], Node]
+) -> list[tuple[int, str]]:
+    """
+    Finds the type mismatches a script is certain to run into, without
+    running it. Variables are assumed to be undefined before the script.
+
+    :return list: the line number and message of each mismatch
+    """
+
+    types: dict[str, Type] = {}
+    errors = []
+
+    for lineno, line in enumerate(lines, start=1):
+        command = line.strip()
+        if not command:
+            continue
+
+        try:
+            ast = parse(command)
+        except Error:
+            continue
+
+        if ast.node_type == NodeType.EXIT:
+            break
+
+        mismatches: list[str] = []
+        try:
+            if ast.node_type == NodeType.ASSIGNMENT:
+                infer(ast.children[0], types, mismatches)
+            elif ast.node_type not in (NodeType.BEG, NodeType.OUTPUT):
+                infer(ast, types, mismatches)
+        except RecursionError:
+            pass  # too deeply nested to be checked
+
+        errors += [(lineno, message) for message in mismatches]
+        assign(types, ast)
+
+    return errors
@@ -0,0 +1,226 @@
+"""
+Providers of the values read by BEG.
+
+By default BEG prompts on the terminal. A script can instead be fed from
+values bound ahead of time, either by variable name or in the order the BEG
+commands run, and loaded from a dict, an iterator or a file:
+
+    python main.py script.snol --inputs values.json
+
+Bound values are converted to numbers once, when the provider is created,
+with the same int and float rules as the prompt.
+"""
+
+import csv
+import json
+from collections import deque
+from collections.abc import Iterable, Mapping
+from typing import Callable, Protocol
+
+import output
+from interfaces import Error, Node, NodeType, to_number
+
+
+class InputProvider(Protocol):
+    def read(self, variable: str) -> int | float: ...
+
+    def missing(self, begs: list[tuple[int, str]]) -> list[tuple[int, str]]: ...
+
+
+class Console:
+    """
+    Prompts for every value on the terminal.
+    """
+
+    def read(self, variable: str) -> int | float:
+        output.flush()  # the prompt comes after what was printed before it
+        return to_number(input(f"\nProvide a value for variable {variable} >> "))
+
+    def missing(self, begs: list[tuple[int, str]]) -> list[tuple[int, str]]:
+        return []
+
+
+class BoundInputs:
+    """
+    Values bound to variable names. A variable bound to a single value gets
+    it on every BEG, while a variable bound to a list gets its values one BEG
+    at a time, in order.
+    """
+
+    def __init__(self, bindings: Mapping[str, object]) -> None:
+        self.constants: dict[str, int | float] = {}
+        self.queues: dict[str, deque[int | float]] = {}
+
+        for variable, value in bindings.items():
+            if isinstance(value, (list, tuple)):
+                self.queues[variable] = deque(_number(item) for item in value)
+            else:
+                self.constants[variable] = _number(value)
+
+    def read(self, variable: str) -> int | float:
+        value = self.constants.get(variable)
+        if value is not None:
+            return value
+
+        queue = self.queues.get(variable)
+        if not queue:
+            raise Error(f"No value provided for variable {variable}")
+        return queue.popleft()
+
+    def missing(self, begs: list[tuple[int, str]]) -> list[tuple[int, str]]:
+        remaining = {variable: len(queue) for variable, queue in self.queues.items()}
+        missing = []
+
+        for lineno, variable in begs:
+            if variable in self.constants:
+                continue
+            if remaining.get(variable, 0) > 0:
+                remaining[variable] -= 1
+            else:
+                missing.append((lineno, variable))
+
+        return missing
+
+
+class SequenceInputs:
+    """
+    Values taken one BEG at a time in the order they are given, whatever the
+    variable. The iterable is consumed when the provider is created.
+    """
+
+    def __init__(self, values: Iterable[object]) -> None:
+        self.values: deque[int | float] = deque(_number(value) for value in values)
+
+    def read(self, variable: str) -> int | float:
+        if not self.values:
+            raise Error(f"No value provided for variable {variable}")
+        return self.values.popleft()
+
+    def missing(self, begs: list[tuple[int, str]]) -> list[tuple[int, str]]:
+        return begs[len(self.values) :]
+
+
+def _number(value: object) -> int | float:
+    if isinstance(value, str):
+        try:
+            return to_number(value.strip())
+        except ValueError:
+            raise Error(f"Provided value {value!r} is not a number")
+
+    if type(value) not in (int, float):
+        raise Error(f"Provided value {value!r} is not a number")
+
+    return value  # type: ignore[return-value]
+
+
+# the provider BEG reads from, see `set_provider`
+_provider: InputProvider = Console()
+
+
+def read(variable: str) -> int | float:
+    """
+    Reads the value of a BEG command from the current provider.
+
+    :raises: Error if the provider has no value left, ValueError if the
+             value typed on the terminal is not a number
+    """
+
+    return _provider.read(variable)
+
+
+def set_provider(provider: InputProvider) -> InputProvider:
+    """
+    :return InputProvider: the provider that was replaced
+    """
+
+    global _provider
+
+    previous, _provider = _provider, provider
+    return previous
+
+
+def find_begs(
+    lines: Iterable[str], parse: Callable[[str], Node]
+) -> list[tuple[int, str]]:
+    """
+    Lists the BEG commands of a script, in order, along with their line
+    number, up to the first EXIT!. Lines that fail to parse are skipped,
+    their error is reported when the script runs.
+    """
+
+    begs = []
+
+    for lineno, line in enumerate(lines, start=1):
+        command = line.strip()
+        if "BEG" not in command and "EXIT!" not in command:
+            continue
+
+        try:
+            ast = parse(command)
+        except Error:
+            continue
+
+        if ast.node_type == NodeType.EXIT:
+            break  # the BEG commands after it never run
+        if ast.node_type == NodeType.BEG:
+            begs.append((lineno, str(ast.value)))
+
+    return begs
+
+
+def load_inputs(path: str) -> InputProvider:
+    """
+    Loads bound values from a file. In every format, each value is read by
+    a single BEG, and the values of a variable are read in order.
+
+    - JSON files hold an object binding each variable to a value or to a
+      list of values, or an array of values taken in order whatever the
+      variable, like `SequenceInputs`
+    - CSV files have a header row naming the variables, and each following
+      row gives the next value of each variable, empty cells are skipped
+    - any other file has one `variable = value` binding per line, where a
+      variable bound on several lines gets its values in order
+    """
+
+    if path.endswith(".json"):
+        with open(path) as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise Error(f"Invalid JSON inputs: {e}")
+
+        if isinstance(data, list):
+            return SequenceInputs(data)
+        if isinstance(data, dict):
+            return BoundInputs(
+                {
+                    variable: value if isinstance(value, list) else [value]
+                    for variable, value in data.items()
+                }
+            )
+        raise Error("JSON inputs must be an object or an array")
+
+    bindings: dict[str, list[str]] = {}
+
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            reader = csv.reader(file)
+            names = [name.strip() for name in next(reader, [])]
+            for name in names:
+                bindings[name] = []
+
+            for row in reader:
+                for name, cell in zip(names, row):
+                    if cell.strip():
+                        bindings[name].append(cell)
+        else:
+            for lineno, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+
+                variable, equals, value = line.partition("=")
+                if not equals:
+                    raise Error(f"Expected variable = value on line {lineno}")
+                bindings.setdefault(variable.strip(), []).append(value)
+
+    return BoundInputs(bindings)
@@ -0,0 +1,196 @@
+"""
+Optional instrumentation of the interpreter: per-stage timing histograms,
+token and node counts, cache hits, error counts, and per-line profiles.
+
+Instrumentation is enabled with `main.enable_instruments`, or the `--profile`
+flag. While disabled, the interpreter never calls a timer.
+"""
+
+import json
+from collections import Counter
+from time import perf_counter
+from typing import Callable
+
+from cache import ParseCache
+from interfaces import Environment, Node
+from lexer import lexer
+from optimizer import optimizer
+from parser import parser
+
+
+class Histogram:
+    """
+    Durations in buckets whose bounds are powers of two microseconds, so
+    bucket `i` counts the durations below 2**i microseconds.
+    """
+
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+        self.buckets: Counter[int] = Counter()
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+        self.buckets[int(seconds * 1_000_000).bit_length()] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "min_seconds": self.minimum if self.count else 0.0,
+            "max_seconds": self.maximum,
+            "buckets": {
+                f"<{2 ** bucket}us": self.buckets[bucket]
+                for bucket in sorted(self.buckets)
+            },
+        }
+
+
+class LineProfile:
+    __slots__ = ("command", "hits", "seconds")
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.hits = 0
+        self.seconds = 0.0
+
+
+class Instruments:
+    """
+    Collects the measurements of every command run through `run`. The front
+    end is timed through `front_end`, which the parse cache calls on misses,
+    so cached commands only count towards the cache hits.
+    """
+
+    def __init__(self, cache: ParseCache | None = None) -> None:
+        self.cache = cache
+        self.stages = {
+            stage: Histogram()
+            for stage in ("lexer", "parser", "optimizer", "evaluator")
+        }
+        self.counters: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.lines: dict[int, LineProfile] = {}
+
+    def front_end(self, command: str) -> Node:
+        start = perf_counter()
+        try:
+            tokens = lexer(command)
+        finally:
+            lexed = perf_counter()
+            self.stages["lexer"].record(lexed - start)
+
+        self.counters["tokens"] += len(tokens)
+
+        try:
+            ast = parser(tokens)
+        finally:
+            parsed = perf_counter()
+            self.stages["parser"].record(parsed - lexed)
+
+        self.counters["nodes"] += count_nodes(ast)
+
+        try:
+            return optimizer(ast)
+        finally:
+            self.stages["optimizer"].record(perf_counter() - parsed)
+
+    def run(
+        self,
+        command: str,
+        env: Environment,
+        parse: Callable[[str], Node],
+        execute: Callable[[str, Node, Environment], None],
+        lineno: int | None = None,
+    ):
+        """
+        Runs a command like `main.interpret`, timing the evaluator and, when
+        the line number is given, the whole line.
+        """
+
+        self.counters["commands"] += 1
+        start = perf_counter()
+
+        try:
+            ast = parse(command)
+            evaluating = perf_counter()
+            try:
+                execute(command, ast, env)
+            finally:
+                self.stages["evaluator"].record(perf_counter() - evaluating)
+        except Exception as e:
+            self.errors[type(e).__name__] += 1
+            raise
+        finally:
+            if lineno is not None:
+                line = self.lines.get(lineno)
+                if line is None:
+                    line = self.lines[lineno] = LineProfile(command)
+                line.hits += 1
+                line.seconds += perf_counter() - start
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {stage: h.to_dict() for stage, h in self.stages.items()},
+            "counters": dict(self.counters),
+            "errors": dict(self.errors),
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "lines": {
+                str(lineno): {
+                    "command": line.command,
+                    "hits": line.hits,
+                    "seconds": line.seconds,
+                }
+                for lineno, line in sorted(self.lines.items())
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def report(self) -> str:
+        """
+        :return str: the time spent in each stage, followed by the hits and
+                     cumulative time of each line
+        """
+
+        listing = [f"{'stage':<10} {'calls':>8} {'total ms':>10} {'max ms':>10}"]
+        for stage, histogram in self.stages.items():
+            listing.append(
+                f"{stage:<10} {histogram.count:>8} {histogram.total * 1000:>10.3f}"
+                f" {histogram.maximum * 1000:>10.3f}"
+            )
+
+        if "eliminated" in self.counters:
+            listing.append(f"\neliminated statements: {self.counters['eliminated']}")
+
+        if self.lines:
+            listing.append("")
+            listing.append(f"{'line':>6} {'hits':>8} {'total ms':>10}  command")
+            for lineno, line in sorted(self.lines.items()):
+                listing.append(
+                    f"{lineno:>6} {line.hits:>8} {line.seconds * 1000:>10.3f}"
+                    f"  {line.command}"
+                )
+
+        return "\n".join(listing)
+
+
+def count_nodes(ast: Node | None) -> int:
+    count = 0
+    stack = [ast]
+
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Node):
+            count += 1
+            stack.extend(node.children)
+
+    return count
@@ -1,4 +1,6 @@
-from typing import Dict, TypeAlias
+from enum import IntEnum
+from collections.abc import MutableMapping
+from typing import TypeAlias
 
 """
 GRAMMAR (modified EBNF):
@@ -58,19 +60,78 @@ GRAMMAR (modified EBNF):
 """
 
 
+class NodeType(IntEnum):
+    EXPRESSION = 0
+    TERM = 1
+    FACTOR = 2
+    ASSIGNMENT = 3
+    BEG = 4
+    OUTPUT = 5
+    EXIT = 6
+    VARIABLE = 7
+
+
+class Operator(IntEnum):
+    """
+    The binary operators, named after the verb used in their error messages.
+    """
+
+    ADD = 0
+    SUBTRACT = 1
+    MULTIPLY = 2
+    DIVIDE = 3
+    MODULO = 4
+
+
+OPERATORS = {
+    "+": Operator.ADD,
+    "-": Operator.SUBTRACT,
+    "*": Operator.MULTIPLY,
+    "/": Operator.DIVIDE,
+    "%": Operator.MODULO,
+}
+
+
 class Node:
-    def __init__(self, value: str | None, node_type: str, children=[]) -> None:
+    """
+    A node of the abstract syntax tree. Children are stored in a tuple, so
+    that a tree can be safely shared, e.g. by the parse cache.
+
+    The node type may be given by name, it is stored as a `NodeType`. Besides
+    the source text in `value`, operators are stored as an `Operator` in `op`
+    and numbers as their parsed value in `number`, so the evaluator never has
+    to look at the text. The value of a number is parsed from its text, unless
+    it is given, e.g. by the parser from its number token.
+    """
+
+    __slots__ = ("value", "node_type", "children", "op", "number")
+
+    def __init__(
+        self,
+        value: str | None,
+        node_type: str | NodeType,
+        children=(),
+        number: int | float | None = None,
+    ) -> None:
         self.value = value
-        self.node_type = node_type
-        self.children = children
+        self.node_type = (
+            NodeType[node_type] if isinstance(node_type, str) else node_type
+        )
+        self.children = tuple(children)
+        self.op = OPERATORS.get(value) if self.children else None
+
+        if self.children:
+            self.number = None
+        else:
+            self.number = _literal(value) if number is None else number
 
     def __str__(self) -> str:
         if not self.children:
-            return f"<{self.node_type} {self.value}>"
+            return f"<{self.node_type.name} {self.value}>"
 
         children = ", ".join([f"{child}" for child in self.children])
 
-        return f"<{self.node_type} {self.value}> ({children})"
+        return f"<{self.node_type.name} {self.value}> ({children})"
 
     def __eq__(self, other) -> bool:
         tests = [
@@ -82,14 +143,103 @@ class Node:
         return all(tests)
 
 
+# Besides numbers, float() accepts these names, which the evaluator has always
+# treated as numbers rather than variables.
+_FLOAT_NAMES = {"inf", "infinity", "nan"}
+
+
+def _literal(value) -> int | float | None:
+    if value is None:
+        return None
+
+    value = str(value)
+    text = value[1:] if value[:1] in ("+", "-") else value
+
+    if not (text[:1].isdigit() or text.lower() in _FLOAT_NAMES):
+        return None
+
+    try:
+        return to_number(value)
+    except ValueError:
+        return None
+
+
+def to_number(value: str) -> int | float:
+    """
+    Converts the text of a number the way the evaluator does, as an int if
+    possible and as a float otherwise.
+
+    :raises: ValueError if the text is not a number
+    """
+
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
 class Error(Exception):
     def __init__(self, message: str) -> None:
         super().__init__(message)
 
 
+def describe(error: Exception) -> str:
+    """
+    Formats an error raised by the lexer, parser or evaluator into the message
+    shown to the user.
+    """
+
+    if isinstance(error, KeyError):
+        return f"Variable {error} is not defined"
+    if isinstance(error, ValueError):
+        return "provided value is not a number"
+    return str(error)
+
+
 # An Environment consists of str-Variable pairs,
 # denoting name and their value in memory.
-Environment: TypeAlias = Dict[str, int | float]
+Environment: TypeAlias = MutableMapping[str, int | float]
 
 # A Token is a tuple of two strings, the type of the token, and the value
 Token: TypeAlias = tuple[str, str]
+
+
+class NumberToken(tuple):
+    """
+    A ("NUMBER", text) token that also carries the parsed value of the number,
+    so that it never has to be converted again.
+
+    The value is stored in the tuple after the text, so that tokens need no
+    attribute dictionary, but it is hidden from iteration and comparisons:
+    the token is still the pair of its type and text, indexed by 0 and 1.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, text: str, number: int | float):
+        return super().__new__(cls, ("NUMBER", text, number))
+
+    @property
+    def number(self) -> int | float:
+        return self[2]
+
+    def __getnewargs__(self):
+        return (self[1], self[2])
+
+    def __len__(self) -> int:
+        return 2
+
+    def __iter__(self):
+        return iter(self[:2])
+
+    def __eq__(self, other) -> bool:
+        return self[:2] == other
+
+    def __ne__(self, other) -> bool:
+        return self[:2] != other
+
+    def __hash__(self) -> int:
+        return hash(self[:2])
+
+    def __repr__(self) -> str:
+        return repr(self[:2])
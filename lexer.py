@@ -1,38 +1,50 @@
 import re
-from interfaces import Token, Error
+from interfaces import Token, NumberToken, Error
 
 NUMBER = r"\d+\.?\d*"
 VARIABLE = r"[a-zA-Z]+[0-9a-zA-Z]*"
 OPERATOR = r"[=+-/*%]"
 
+# Every token is matched and classified by a single pass of this pattern. The
+# alternatives are tried in order, so keywords take priority over variables.
+_TOKEN_TYPES = {
+    "KEYWORD": r"BEG|PRINT|EXIT!|=",
+    "NUMBER": NUMBER,
+    "VARIABLE": VARIABLE,
+    "PRECEDENCE_1": r"[+-]",
+    "PRECEDENCE_2": r"[*/%]",
+    "PRECEDENCE_3": r"[()]",
+    "INVALID": r"\S",
+}
+_PATTERN = re.compile(
+    "|".join(f"(?P<{name}>{regex})" for name, regex in _TOKEN_TYPES.items())
+)
+# group names cannot contain spaces, so they are mapped to the token types
+_KINDS = {name: name.replace("_", " ") for name in _TOKEN_TYPES}
+
+EOF_TOKEN: Token = ("EOF", "0")
+
 
 def lexer(command: str) -> list[Token]:
-    definitions = "|".join(["BEG", "PRINT", "EXIT!", NUMBER, VARIABLE, OPERATOR, r"\S"])
-    pattern = re.compile(rf"{definitions}")
-
-    tokens = re.findall(pattern, command)
-
-    return _tokenize(tokens)
-
-
-def _tokenize(tokens: list[str]) -> list[Token]:
-    def helper(token: str) -> Token:
-        if re.match(NUMBER, token):
-            return ("NUMBER", token)
-        elif re.match(r"BEG|PRINT|EXIT!|=", token):
-            return ("KEYWORD", token)
-        elif re.match(r"[+-]", token):
-            return ("PRECEDENCE 1", token)
-        elif re.match(r"[*/%]", token):
-            return ("PRECEDENCE 2", token)
-        elif re.match(r"[()]", token):
-            return ("PRECEDENCE 3", token)
-        elif re.match(VARIABLE, token):
-            return ("VARIABLE", token)
+    tokens: list[Token] = []
+
+    for match in _PATTERN.finditer(command):
+        kind = match.lastgroup
+        token = match.group()
+
+        if kind == "NUMBER":
+            tokens.append(_number(token))
+        elif kind == "INVALID":
+            raise Error(f"Invalid token: {token} at column {match.start() + 1}")
         else:
-            raise Error(f"Invalid token: {token}")
+            tokens.append((_KINDS[kind], token))
+
+    tokens.append(EOF_TOKEN)
+
+    return tokens
 
-    tokenized = [helper(token) for token in tokens]
-    tokenized.append(("EOF", "0"))
 
-    return tokenized
+def _number(token: str) -> NumberToken:
+    if "." in token:
+        return NumberToken(token, float(token))
+    return NumberToken(token, int(token))
@@ -9,15 +9,72 @@
     2-BSCS 2024
 """
 
-from interfaces import Environment
+import argparse
+import sys
+from contextlib import nullcontext
+from typing import Iterable, Iterator
+
+from interfaces import Environment, Node
+from environment import SlotEnvironment
 
 
 from lexer import lexer
 from parser import parser
+from cache import ParseCache, CACHE_SIZE
+from compiler import TieredEvaluator
 from evaluator import evaluator
-from interfaces import Error
+from optimizer import optimizer
+from instrumentation import Instruments
+import vm
+import inputs
+import snapshot
+import inference
+import output
+from dataflow import optimize_script
+from tokenizer import tokenize_file
+from reactive import ReactiveScript
+from interfaces import Error, describe
+
+# commands that repeat are compiled once they become hot
+execute = TieredEvaluator()
+
+
+def front_end(command: str) -> Node:
+    """
+    Lexes, parses and optimizes a command.
+    """
+
+    if instruments is not None:
+        return instruments.front_end(command)
+    return optimizer(parser(lexer(command)))
+
+
+# commands that repeat skip the front end, None disables the cache
+cache: ParseCache | None = ParseCache(front_end=front_end)
+
+# None unless enabled, so that no timers run on the hot path
+instruments: Instruments | None = None
+
+
+def enable_instruments() -> Instruments:
+    """
+    Starts measuring every command run through `interpret` or `run_script`.
+    """
+
+    global instruments
 
-# from evaluator import evaluator
+    instruments = Instruments(cache)
+    return instruments
+
+
+def parse(command: str) -> Node:
+    """
+    Runs the front end on a command, going through the parse cache if enabled.
+    """
+
+    if cache is None:
+        return front_end(command)
+    return cache.parse(command)
 
 
 def interpret(command: str, env: Environment):
@@ -30,33 +87,378 @@ def interpret(command: str, env: Environment):
     """
 
     try:
-        tokens = lexer(command)
-        ast = parser(tokens)
-        evaluator(ast, env)
-    except Error as e:
-        print(f"Error: {e}")
-    except KeyError as e:
-        print(f"Error: Variable {e} is not defined")
-    except ValueError as e:
-        print(f"Error: provided value is not a number")
+        if instruments is None:
+            execute(command, parse(command), env)
+        else:
+            instruments.run(command, env, parse, execute)
+    except (Error, KeyError, ValueError, ArithmeticError) as e:
+        output.error(f"Error: {describe(e)}")
+
+
+def _read_commands(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """
+    Yields the non-blank lines of a script along with their line number. The
+    indentation is kept, so errors report the columns of the file.
+    """
+
+    for lineno, line in enumerate(lines, start=1):
+        command = line.rstrip()
+        if command:
+            yield lineno, command
+
+
+def run_script(lines: Iterable[str], env: Environment, optimize: bool = False) -> int:
+    """
+    Runs a whole SNOL script without prompts. Lines are streamed through the
+    lexer, parser and evaluator one at a time, so the script is never fully
+    loaded in memory. Errors are reported to stderr along with their line
+    number, and execution continues with the next line.
+
+    With `optimize`, the whole script is loaded and optimized first, see
+    `dataflow.py`, and the number of statements it eliminated is reported to
+    stderr once the script has run.
+
+    :param lines Iterable[str]: the lines of the script, e.g. an open file
+    :param env Environment: the variable environment of the current program
+    :param optimize bool: whether to propagate constants and drop dead stores
+    :return int: the exit code, 0 if every line ran without errors, else 1
+    """
+
+    if optimize:
+        return _run_optimized(lines, env)
+
+    status = 0
+
+    for lineno, command in _read_commands(lines):
+        try:
+            if instruments is None:
+                execute(command, parse(command), env)
+            else:
+                instruments.run(command, env, parse, execute, lineno)
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            output.error(f"Error on line {lineno}: {describe(e)}")
+            status = 1
+        except SystemExit:
+            break
+
+    return status
+
+
+def _run_optimized(lines: Iterable[str], env: Environment) -> int:
+    statements, eliminated = optimize_script(lines, parse)
+    status = 0
+
+    for lineno, command, ast, rewritten in statements:
+        # a rewritten AST no longer matches the command keying the tiered
+        # evaluator, and it only runs once
+        run = _evaluate if rewritten else execute
+        parse_command = parse if ast is None else lambda _: ast
+
+        try:
+            if instruments is None:
+                run(command, parse_command(command), env)
+            else:
+                instruments.run(command, env, parse_command, run, lineno)
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            output.error(f"Error on line {lineno}: {describe(e)}")
+            status = 1
+        except SystemExit:
+            break
+
+    # the profile reports it along with the time spent
+    if instruments is None:
+        output.error(f"Eliminated statements: {eliminated}")
+    else:
+        instruments.counters["eliminated"] += eliminated
+
+    return status
+
+
+def _evaluate(command: str, ast: Node, env: Environment):
+    evaluator(ast, env)
+
+
+def run_file(path: str, env: Environment) -> int:
+    """
+    Runs a script file like `run_script`, tokenizing it in one pass over a
+    memory mapping, see `tokenizer.py`. Lines missing from the parse cache
+    are parsed from their tokens, without being lexed again.
+
+    :param path str: the script file
+    :param env Environment: the variable environment of the current program
+    :return int: the exit code, 0 if every line ran without errors, else 1
+    """
+
+    status = 0
+
+    for line in tokenize_file(path):
+        command = line.text()
+        if not command:
+            continue
+
+        def parse_tokens(_: str) -> Node:
+            return optimizer(parser(line.tokens()))
+
+        try:
+            if cache is None:
+                ast = parse_tokens(command)
+            else:
+                ast = cache.parse(command, parse_tokens)
+            execute(command, ast, env)
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            output.error(f"Error on line {line.lineno}: {describe(e)}")
+            status = 1
+        except SystemExit:
+            break
+
+    return status
+
+
+def interpret_reactive(command: str, script: ReactiveScript):
+    """
+    Interprets a command like `interpret`, recomputing the assignments that
+    depend on the variable it binds.
+    """
+
+    try:
+        recomputed = script.run(command)
+    except (Error, KeyError, ValueError, ArithmeticError) as e:
+        output.error(f"Error: {describe(e)}")
+        return
 
+    for variable in recomputed:
+        if variable in script.failed:
+            output.error(
+                f"Error: Cannot recompute {variable}, {script.failed[variable]}"
+            )
 
-def eval_loop():
+
+def eval_loop(env: Environment, reactive: bool = False):
     """
     The Evaluation Loop of the program, also known as the User Interface.
     """
-    env: Environment = {}
+    script = ReactiveScript(env, parse) if reactive else None
 
     while True:
         command = input("\nSNOL $> ")
-        interpret(command, env)
+        if script is None:
+            interpret(command, env)
+        else:
+            interpret_reactive(command, script)
+
+
+def bind_inputs(path: str, lines: Iterable[str]) -> bool:
+    """
+    Makes BEG read its values from a file instead of the terminal. The BEG
+    commands of the script left without a value are reported up front.
+
+    :param path str: the file of values, see `inputs.load_inputs`
+    :param lines Iterable[str]: the lines of the script
+    :return bool: True if every BEG command has a value
+    """
+
+    provider = inputs.load_inputs(path)
+    missing = provider.missing(inputs.find_begs(lines, parse))
+
+    for lineno, variable in missing:
+        print(
+            f"Error on line {lineno}: No value provided for variable {variable}",
+            file=sys.stderr,
+        )
+
+    inputs.set_provider(provider)
+    return not missing
+
+
+def _write_profile(report: bool, path: str | None):
+    assert instruments is not None
+
+    if report:
+        print(instruments.report(), file=sys.stderr)
+
+    if path:
+        with open(path, "w") as file:
+            file.write(instruments.to_json())
 
 
 def main():
+    global cache
+
+    arguments = argparse.ArgumentParser(description="The SNOL interpreter")
+    arguments.add_argument("script", nargs="?", help="run a script without prompts")
+    arguments.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_SIZE,
+        help="number of parsed commands to keep, 0 disables the cache",
+    )
+    arguments.add_argument(
+        "--vm",
+        action="store_true",
+        help="run the script on the bytecode VM, caching it in a .snolc file",
+    )
+    arguments.add_argument(
+        "--disassemble",
+        action="store_true",
+        help="print the bytecode of the script instead of running it",
+    )
+    arguments.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each stage and on each line to stderr",
+    )
+    arguments.add_argument(
+        "--profile-json", help="write the measurements of the run to a JSON file"
+    )
+    arguments.add_argument(
+        "--optimize",
+        action="store_true",
+        help="propagate constants and drop dead stores across the whole script",
+    )
+    arguments.add_argument(
+        "--mmap",
+        action="store_true",
+        help="tokenize the script file in one pass over a memory mapping",
+    )
+    arguments.add_argument(
+        "--reactive",
+        action="store_true",
+        help="recompute the assignments depending on a variable when it changes",
+    )
+    arguments.add_argument(
+        "--check",
+        action="store_true",
+        help="report the type mismatches of the script without running it",
+    )
+    arguments.add_argument(
+        "--output", help="write the output of PRINT to a file instead of stdout"
+    )
+    arguments.add_argument(
+        "--flush",
+        choices=output.POLICIES,
+        help="when output is written: per line (the default at the prompt), when"
+        " the buffer is full (the default for scripts), or at the end",
+    )
+    arguments.add_argument(
+        "--restore", help="start from the variables saved in a snapshot file"
+    )
+    arguments.add_argument(
+        "--checkpoint", help="save the variables to a snapshot file on exit"
+    )
+    arguments.add_argument(
+        "--inputs",
+        help="read the values of BEG from a JSON, CSV or `variable = value` file",
+    )
+    args = arguments.parse_args()
+
+    if (args.profile or args.profile_json) and (args.vm or args.disassemble):
+        arguments.error("profiling is not supported on the VM")
+
+    if args.optimize and (args.vm or args.disassemble):
+        arguments.error("--optimize is not supported on the VM")
+
+    if args.mmap and (not args.script or args.optimize or args.vm or args.disassemble):
+        arguments.error("--mmap needs a script file, and no --optimize or --vm")
+
+    if args.mmap and (args.profile or args.profile_json):
+        arguments.error("profiling is not supported with --mmap")
+
+    if (args.inputs or args.check) and not args.script and sys.stdin.isatty():
+        arguments.error("--inputs and --check need a script")
+
+    if args.cache_size > 0:
+        cache = ParseCache(args.cache_size, front_end=front_end)
+    else:
+        cache = None
+
+    # only compiled code accesses variables by slot, the VM and the evaluator
+    # look them up by name, which is faster in a dict
+    env: Environment = {} if args.vm or args.disassemble else SlotEnvironment()
+
+    if args.restore:
+        try:
+            snapshot.load(args.restore, env)
+        except (Error, OSError) as e:
+            print(f"Error: {describe(e)}", file=sys.stderr)
+            sys.exit(1)
+
+    interactive = not args.script and sys.stdin.isatty()
+    stream = open(args.output, "w") if args.output else None
+    output.set_output(
+        output.Output(stream, policy=args.flush or ("line" if interactive else "size"))
+    )
+
+    try:
+        _run(args, env)
+    finally:
+        output.flush()
+        if stream is not None:
+            stream.close()
+        if args.checkpoint:
+            snapshot.save(env, args.checkpoint)
+
+
+def _run(args: argparse.Namespace, env: Environment):
+    # stdin can only be read once, a script file is read again for each pass
+    # rather than loaded, so that large scripts run in constant memory
+    lines: list[str] | None = None
+
+    if (args.inputs or args.check) and not args.script:
+        lines = list(sys.stdin)
+
+    if args.inputs:
+        try:
+            with open(args.script) if lines is None else nullcontext(lines) as script:
+                bound = bind_inputs(args.inputs, script)
+        except (Error, OSError) as e:
+            print(f"Error: {describe(e)}", file=sys.stderr)
+            sys.exit(1)
+
+        if not bound:
+            sys.exit(1)
+
+    if args.check:
+        with open(args.script) if lines is None else nullcontext(lines) as script:
+            mismatches = inference.check_script(script, parse)
+
+        for lineno, message in mismatches:
+            print(f"Error on line {lineno}: {message}", file=sys.stderr)
+        sys.exit(1 if mismatches else 0)
+
+    if args.vm or args.disassemble:
+        if args.script and not env:
+            program = vm.load_script(args.script)
+        elif lines is not None:
+            program = vm.compile_script(lines, front_end, env)
+        else:
+            with open(args.script) if args.script else sys.stdin as script:
+                program = vm.compile_script(script, front_end, env)
+
+        if args.disassemble:
+            print(vm.disassemble(program))
+            sys.exit(0)
+        sys.exit(vm.run(program, env))
+
+    if args.profile or args.profile_json:
+        enable_instruments()
+
+    if lines is not None or args.script or not sys.stdin.isatty():
+        if lines is not None:
+            status = run_script(lines, env, args.optimize)
+        elif args.mmap:
+            status = run_file(args.script, env)
+        else:
+            with open(args.script) if args.script else sys.stdin as script:
+                status = run_script(script, env, args.optimize)
+
+        if instruments is not None:
+            _write_profile(args.profile, args.profile_json)
+        sys.exit(status)
+
     print(
         "The SNOL Environment is now active, you may proceed with giving your commands\n"
     )
-    eval_loop()
+    eval_loop(env, args.reactive)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+from typing import TypeAlias
+
+from interfaces import Error, Node, NodeType, Operator
+from compiler import compiler
+
+# The static type of an expression, None when it is only known at runtime
+Type: TypeAlias = type | None
+
+# The positions a node can take in the tree, from the loosest to the tightest
+# binding. A node fits in a position if the evaluator would dispatch on it
+# correctly there, e.g. an <expression> cannot be the right operand of `*`.
+_EXPRESSION, _TERM, _FACTOR = 0, 1, 2
+
+_PRECEDENCE = {
+    Operator.ADD: _EXPRESSION,
+    Operator.SUBTRACT: _EXPRESSION,
+    Operator.MULTIPLY: _TERM,
+    Operator.DIVIDE: _TERM,
+    Operator.MODULO: _TERM,
+}
+
+
+def optimizer(ast: Node) -> Node:
+    """
+    Simplifies an AST before it is evaluated, keeping the semantics of the
+    evaluator, including its int and float rules.
+
+    - constant subtrees are folded into a single number
+    - parentheses that don't change the evaluation order are removed
+    - `x * 1`, `x / 1`, `x + 0` and `x - 0` become `x` when the type of `x`
+      is known to match the type of the literal
+
+    :param ast Node: the abstract syntax tree to be optimized
+    :return Node: the optimized tree, the given tree is left untouched
+    :raises: Error on type mismatches between literals, unless an operand
+             evaluated before them may fail first
+    """
+
+    try:
+        match ast.node_type:
+            case NodeType.EXPRESSION | NodeType.TERM | NodeType.FACTOR:
+                optimized = _optimize(ast, _EXPRESSION)[0]
+                _check_literals(optimized)
+                return optimized
+            case NodeType.ASSIGNMENT:
+                value = _optimize(ast.children[0], _EXPRESSION)[0]
+                _check_literals(value)
+                return Node(ast.value, NodeType.ASSIGNMENT, [value])
+            case _:
+                return ast
+    except RecursionError:
+        # too deeply nested to be optimized, but the evaluator can run it
+        return ast
+
+
+def _optimize(ast: Node | None, position: int) -> tuple[Node | None, Type]:
+    if ast is None:
+        return ast, None
+
+    if ast.op is not None:
+        node, node_type = _optimize_binary(ast)
+        return _unwrap(node, position), node_type
+
+    if ast.value is None:
+        inner, inner_type = _optimize(ast.children[0], _EXPRESSION)
+        return _unwrap(Node(None, NodeType.FACTOR, [inner]), position), inner_type
+
+    return ast, type(ast.number) if ast.number is not None else None
+
+
+def _optimize_binary(ast: Node) -> tuple[Node | None, Type]:
+    op = ast.op
+    precedence = _PRECEDENCE[op]
+
+    left, left_type = _optimize(ast.children[0], precedence)
+    right, right_type = _optimize(ast.children[1], precedence + 1)
+    node = Node(ast.value, ast.node_type, [left, right])
+
+    # a successful operation has the type of both of its operands
+    result_type = left_type or right_type
+
+    left_literal = _literal(left)
+    right_literal = _literal(right)
+
+    if left_literal is not None and right_literal is not None:
+        return _fold(node), result_type
+
+    if _is_identity(op, right_literal, left_type):
+        return left, result_type
+    if op in (Operator.ADD, Operator.MULTIPLY) and _is_identity(
+        op, left_literal, right_type
+    ):
+        return right, result_type
+
+    return node, result_type
+
+
+def _is_identity(op: Operator, literal: int | float | None, other: Type) -> bool:
+    """
+    Checks if the literal leaves the other operand of the operation unchanged.
+    The type of the other operand must be known to match, otherwise the
+    evaluator would fail with a type mismatch. Adding a float 0.0 is not an
+    identity, as -0.0 + 0.0 is 0.0.
+    """
+
+    if literal is None or type(literal) != other:
+        return False
+
+    match op:
+        case Operator.MULTIPLY | Operator.DIVIDE:
+            return literal == 1
+        case Operator.SUBTRACT:
+            return literal == 0
+        case Operator.ADD:
+            return literal == 0 and other == int
+        case _:
+            return False
+
+
+def _fold(node: Node) -> Node:
+    try:
+        value = compiler(node)({})
+        return Node(str(value), NodeType.FACTOR, number=value)
+    except (Error, ZeroDivisionError, ValueError):
+        # left for the evaluator to fail on, or too large to be written back
+        return node
+
+
+def _check_literals(ast: Node | None):
+    """
+    Raises the type mismatch of the first operation on literals that failed
+    to fold, if it is the first error the evaluator would run into. The
+    operands are visited in the order they are evaluated, and the search
+    stops at the first one that may fail at runtime, like a variable that
+    may be undefined, or a division by zero.
+    """
+
+    stack = [ast]
+
+    while stack:
+        node = stack.pop()
+
+        if node is None:
+            return  # incomplete, the evaluator fails on it
+        if node.number is not None:
+            continue
+
+        if node.op is None:
+            if node.value is not None:
+                return  # a variable
+            stack.append(node.children[0])
+            continue
+
+        left, right = node.children
+        if _literal(left) is None or _literal(right) is None:
+            stack += [right, left]
+            continue
+
+        try:
+            compiler(node)({})
+        except (ZeroDivisionError, ValueError):
+            return
+
+
+def _literal(ast: Node | None) -> int | float | None:
+    if ast is None:
+        return
+    return ast.number
+
+
+def _unwrap(ast: Node | None, position: int) -> Node | None:
+    """
+    Removes the parentheses around a node if it fits in the given position
+    without them.
+    """
+
+    if ast is None or ast.value is not None or ast.children[0] is None:
+        return ast
+
+    inner = ast.children[0]
+
+    if _precedence(inner) >= position:
+        return inner
+    return ast
+
+
+def _precedence(ast: Node) -> int:
+    if ast.op is not None:
+        return _PRECEDENCE[ast.op]
+    return _FACTOR
@@ -0,0 +1,111 @@
+"""
+The output of PRINT, and of the errors reported while running commands.
+
+Output is collected in a buffer and written to its stream according to a
+flush policy:
+
+- "line" writes every line as soon as it is printed, for interactive use
+- "size" writes once the buffer holds `size` characters
+- "end" writes only when flushed, e.g. at the end of a script
+
+Errors go to their own stream, after flushing the output printed before
+them, so both streams stay in the order the commands ran.
+"""
+
+import sys
+from typing import TextIO
+
+POLICIES = ("line", "size", "end")
+
+# The number of characters buffered by the "size" policy
+BUFFER_SIZE = 64 * 1024
+
+
+class Output:
+    """
+    :param stream TextIO: where output is written, e.g. a file or a
+                          `StringIO`, stdout when None
+    :param errors TextIO: where errors are written, stderr when None
+    :param policy str: when the buffer is written, see `POLICIES`
+    :param size int: the size of the buffer for the "size" policy
+    """
+
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        errors: TextIO | None = None,
+        policy: str = "line",
+        size: int = BUFFER_SIZE,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown flush policy {policy}")
+
+        self.stream = stream
+        self.errors = errors
+        self.policy = policy
+        self.limit = {"line": 0, "size": size, "end": float("inf")}[policy]
+        self.pending: list[str] = []
+        self.size = 0
+
+    def write(self, text: str):
+        """
+        Prints a line of output.
+        """
+
+        self.pending.append(text)
+        self.size += len(text) + 1
+
+        if self.size > self.limit:
+            self.flush()
+
+    def error(self, text: str):
+        """
+        Reports a line to the error stream, after the output printed so far.
+        """
+
+        self.flush()
+
+        errors = self.errors or sys.stderr
+        errors.write(text + "\n")
+        errors.flush()
+
+    def flush(self):
+        stream = self.stream or sys.stdout
+
+        if self.pending:
+            self.pending.append("")
+            stream.write("\n".join(self.pending))
+            self.pending.clear()
+            self.size = 0
+
+        stream.flush()
+
+
+# the output PRINT writes to, see `set_output`
+_output = Output()
+
+
+def write(text: str):
+    _output.write(text)
+
+
+def error(text: str):
+    _output.error(text)
+
+
+def flush():
+    _output.flush()
+
+
+def set_output(output: Output) -> Output:
+    """
+    Flushes the current output and replaces it.
+
+    :return Output: the output that was replaced
+    """
+
+    global _output
+
+    _output.flush()
+    previous, _output = _output, output
+    return previous
@@ -1,17 +1,42 @@
-from interfaces import Node, Error
-from typing import TypeAlias
+from interfaces import Node, NodeType, NumberToken, Error
+from typing import Callable, TypeAlias
 from lexer import Token
 
 Command: TypeAlias = list[Token]
 
+EOF: Token = ("EOF", "0")
+
+
+class TokenStream:
+    """
+    A cursor over the tokens of a command. The parser advances the cursor
+    instead of removing tokens, so the given list is never modified.
+    """
+
+    def __init__(self, tokens: Command) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Token:
+        try:
+            return self.tokens[self.position + offset]
+        except IndexError:
+            raise Error("Unexpected end of line")
+
+    def next(self) -> Token:
+        token = self.peek()
+        self.position += 1
+        return token
+
 
 def parser(tokens: Command) -> Node:
-    return _parse_command(tokens)
+    return _parse_command(TokenStream(tokens))
 
 
-def _parse_command(command: Command) -> Node:
+def _parse_command(command: TokenStream) -> Node:
     """
-    Attempts to parse a command from the given tokens.
+    Attempts to parse a command from the given tokens. The production is
+    predicted from the first token, see `_PREDICTIONS`.
 
     <command> : ( <expression>
                 | <assignment>
@@ -24,150 +49,214 @@ def _parse_command(command: Command) -> Node:
              line.
     """
 
-    ast: Node | None = (
-        _parse_assignment(command)
-        or _parse_output(command)
-        or _parse_exit(command)
-        or _parse_expression(command)
+    first = command.peek()
+    production = (
+        _PREDICTIONS.get(first) or _PREDICTIONS.get(first[0]) or _parse_expression
     )
 
+    ast: Node | None = production(command)
+
     if not ast:
         raise Error("Invalid command")
 
-    if command[0] != ("EOF", "0"):
+    if command.peek() != EOF:
         raise Error("Parser failed to reach end of line")
 
     return ast
 
 
-def _parse_expression(expression: list[Token]) -> Node | None:
+# The frames of the stack used by `_parse_expression`
+_EXPRESSION, _TERM, _FACTOR = range(3)
+
+LEFT_PARENTHESIS: Token = ("PRECEDENCE 3", "(")
+RIGHT_PARENTHESIS: Token = ("PRECEDENCE 3", ")")
+
+
+def _parse_expression(expression: TokenStream) -> Node | None:
     """
     Attempts to parse an expression from the given tokens.
 
     <expression> : <term> { <precedence_1> <term> }
+    <term>       : <factor> { <precedence_2> <factor> }
+    <factor>     : <number>
+                 | <variable>
+                 | <(> expression <)>
+
+    The three productions are parsed with an explicit stack instead of
+    recursion, so parentheses can be nested to any depth. Each frame is an
+    expression or a term with the operand parsed so far and the operator
+    waiting for its right operand, or a factor waiting for its `)`.
 
     :return: The parsed expression as an AST.
     """
-    left = _parse_term(expression) or None
-
-    # if left is not a term, return None
-    if not left:
-        return
-
-    while expression[0][0] == "PRECEDENCE 1" and expression[1][0] == "PRECEDENCE 1":
-        while expression[0][1] == "+" and expression[1][0] == "PRECEDENCE 1":
-            del expression[0]
-        while expression[0][1] == "-" and expression[1][0] == "PRECEDENCE 1":
-            del expression[1]
-            if expression[0][1] == "-":
-                del expression[0]
-                expression.insert(0, ("PRECEDENCE 1", "+"))
-
-    while expression[0][0] == "PRECEDENCE 1":
-        operator = expression[0][1]
-
-        del expression[0]
-
-        right = _parse_term(expression)
-
-        left = Node(operator, "EXPRESSION", [left, right])
 
-    return left
-
-
-def _parse_term(term) -> Node | None:
+    stack: list[tuple[int, Node | None, str | None]] = []
+    production = _EXPRESSION
+
+    while True:
+        # descend to the next factor, opening its parentheses
+        if production == _EXPRESSION:
+            stack.append((_EXPRESSION, None, None))
+            production = _TERM
+        if production == _TERM:
+            stack.append((_TERM, None, None))
+
+        if expression.peek() == LEFT_PARENTHESIS:
+            expression.next()  # remove left parenthesis
+            stack.append((_FACTOR, None, None))
+            production = _EXPRESSION
+            continue
+
+        result = _parse_factor(expression)
+
+        # ascend until a production expects another operand
+        while stack:
+            frame, left, operator = stack.pop()
+
+            if frame == _FACTOR:
+                if expression.peek() != RIGHT_PARENTHESIS:
+                    raise Error("Expected right parenthesis")
+                expression.next()  # remove right parenthesis
+                result = Node(None, NodeType.FACTOR, [result])
+                continue
+
+            if left is None:
+                # a production whose first operand is missing is missing too
+                if result is None:
+                    continue
+                left = result
+            else:
+                node_type = (
+                    NodeType.EXPRESSION if frame == _EXPRESSION else NodeType.TERM
+                )
+                left = Node(operator, node_type, [left, result])
+
+            if frame == _TERM:
+                if expression.peek()[0] == "PRECEDENCE 2":
+                    stack.append((_TERM, left, expression.next()[1]))
+                    production = _FACTOR
+                    break
+            elif operator is None:
+                operator = _fold_signs(expression)
+                if operator:
+                    stack.append((_EXPRESSION, left, operator))
+                    production = _TERM
+                    break
+            elif expression.peek()[0] == "PRECEDENCE 1":
+                stack.append((_EXPRESSION, left, expression.next()[1]))
+                production = _TERM
+                break
+
+            result = left
+        else:
+            return result
+
+
+def _fold_signs(expression: TokenStream) -> str | None:
     """
-    Attempts to parse a term from the given tokens.
-
-    <term> : <factor> { <precedence_2> <factor> }
+    Consumes the run of `+` and `-` operators following the first term of an
+    expression, and returns the single operator it folds into.
 
-    :return: The parsed term as an AST.
+    A `+` gives way to the operator after it, while a `-` swallows the
+    operator after it and turns into a `+`.
     """
 
-    left = _parse_factor(term) or None
-
-    # if left is not a factor, return None
-    if not left:
+    if expression.peek()[0] != "PRECEDENCE 1":
         return
 
-    while term[0][0] == "PRECEDENCE 2":
-        operator = term[0][1]
-        del term[0]
-
-        right = _parse_factor(term)
+    operator = expression.next()[1]
 
-        left = Node(operator, "TERM", [left, right])
+    while expression.peek()[0] == "PRECEDENCE 1":
+        following = expression.next()[1]
+        operator = following if operator == "+" else "+"
 
-    return left
+    return operator
 
 
-def _parse_factor(factor) -> Node | None:
+def _parse_factor(factor: TokenStream) -> Node | None:
     """
-    Attempts to parse a factor from the given tokens.
+    Attempts to parse a number or a variable from the given tokens, see
+    `_parse_expression` for parenthesized factors.
 
     <factor> : <number>
              | <variable>
-             | <(> expression <)>
     """
 
-    if factor[0] == ("PRECEDENCE 3", "("):
-        del factor[0]  # remove left parenthesis
-        result = _parse_expression(factor)
-        if factor[0] != ("PRECEDENCE 3", ")"):
-            raise Error("Expected right parenthesis")
-        del factor[0]  # remove right parenthesis
-        result = Node(None, "FACTOR", [result])
+    first = factor.peek()
+    second = factor.peek(1)
+
+    if first[0] == "PRECEDENCE 1" and second[0] == "NUMBER" or second[0] == "VARIABLE":
+        negative = first[1] != "+"
+        result = Node(
+            ("-" if negative else "") + second[1],
+            NodeType.FACTOR,
+            number=_number(second, negative),
+        )
+        factor.next()
+        factor.next()
         return result
 
-    elif (
-        factor[0][0] == "PRECEDENCE 1"
-        and factor[1][0] == "NUMBER"
-        or factor[1][0] == "VARIABLE"
-    ):
-        result = Node(("" if factor[0][1] == "+" else "-") + factor[1][1], "FACTOR")
-        del factor[0]
-        del factor[0]
-        return result
-
-    elif factor[0][0] == "NUMBER" or factor[0][0] == "VARIABLE":
-        result = Node(factor[0][1], "FACTOR")
-        del factor[0]
+    elif first[0] == "NUMBER" or first[0] == "VARIABLE":
+        result = Node(first[1], NodeType.FACTOR, number=_number(first, False))
+        factor.next()
         return result
     # edge case falls off and returns None
 
 
-def _parse_assignment(assignment) -> Node | None:
-    if assignment[0] == ("KEYWORD", "BEG") and assignment[1][0] == "VARIABLE":
-        del assignment[0]
-        result = Node(assignment[0][1], "BEG")
-        del assignment[0]
-        return result
-    elif assignment[0][0] != "VARIABLE" or assignment[1] != ("KEYWORD", "="):
-        return
+def _number(token: Token, negative: bool) -> int | float | None:
+    """
+    :return: the value of a number token from the lexer, None for other
+             tokens, whose text is left for the node to parse
+    """
+
+    if type(token) is not NumberToken:
+        return None
+    return -token.number if negative else token.number
+
 
-    variable = assignment[0][1]
-    del assignment[0]
-    del assignment[0]  # remove equal sign
+def _parse_assignment(assignment: TokenStream) -> Node | None:
+    if assignment.peek(1) != ("KEYWORD", "="):
+        return _parse_expression(assignment)
+
+    variable = assignment.next()[1]
+    assignment.next()  # remove equal sign
 
     expression = _parse_expression(assignment)
 
-    return Node(variable, "ASSIGNMENT", [expression])
+    return Node(variable, NodeType.ASSIGNMENT, [expression])
 
 
-def _parse_output(output) -> Node | None:
-    if output[0] != ("KEYWORD", "PRINT"):
-        return
+def _parse_beg(beg: TokenStream) -> Node | None:
+    if beg.peek(1)[0] != "VARIABLE":
+        return _parse_expression(beg)
 
-    del output[0]  # remove print keyword
+    beg.next()  # remove beg keyword
+    return Node(beg.next()[1], NodeType.BEG)
 
-    if output[0][0] == "NUMBER" or output[0][0] == "VARIABLE":
-        result = Node(output[0][0], "OUTPUT", [output[0][1]])
-        del output[0]
-        return result
+
+def _parse_output(output: TokenStream) -> Node | None:
+    output.next()  # remove print keyword
+
+    if output.peek()[0] == "NUMBER" or output.peek()[0] == "VARIABLE":
+        token_type, value = output.next()
+        return Node(token_type, NodeType.OUTPUT, [value])
+
+    # the print keyword stays consumed, and the rest is parsed as a command
+    return _parse_exit(output) or _parse_expression(output)
 
 
-def _parse_exit(cmd) -> Node | None:
-    if cmd[0] != ("KEYWORD", "EXIT!"):
+def _parse_exit(cmd: TokenStream) -> Node | None:
+    if cmd.peek() != ("KEYWORD", "EXIT!"):
         return
-    del cmd[0]
-    return Node(None, "EXIT")
+    cmd.next()
+    return Node(None, NodeType.EXIT)
+
+
+# The production of a command is predicted from its first token, or from the
+# type of its first token. Commands that match neither are expressions.
+_PREDICTIONS: dict[Token | str, Callable[[TokenStream], Node | None]] = {
+    ("KEYWORD", "BEG"): _parse_beg,
+    ("KEYWORD", "PRINT"): _parse_output,
+    ("KEYWORD", "EXIT!"): _parse_exit,
+    "VARIABLE": _parse_assignment,
+}
@@ -0,0 +1,199 @@
+"""
+Incremental recomputation of assignments, for scripts used like spreadsheets.
+
+Each assignment is kept as the formula of its variable, along with the
+variables it reads. When a variable is bound again, by BEG or by another
+assignment, only the assignments that depend on it are recomputed, in
+topological order, so the cost is proportional to the variables affected.
+
+An assignment reading its own variable, like a counter `x = x + 1`, runs
+once and binds its variable to the result, without becoming a formula. A
+formula cannot depend on its own variable through others, since recomputing
+it would never settle. Such assignments are rejected.
+"""
+
+from typing import Callable
+
+import inputs
+from compiler import Compiled, compiler
+from environment import SlotEnvironment
+from evaluator import evaluator
+from interfaces import Environment, Error, Node, NodeType, describe
+from lexer import lexer
+from optimizer import optimizer
+from parser import parser
+
+
+def front_end(command: str) -> Node:
+    return optimizer(parser(lexer(command)))
+
+
+class ReactiveScript:
+    """
+    Runs commands against an environment while tracking the dependencies
+    between assignments. Recomputations that fail leave their variable
+    undefined, and are reported in `failed` until they succeed again.
+    """
+
+    def __init__(
+        self,
+        env: Environment | None = None,
+        parse: Callable[[str], Node] = front_end,
+    ) -> None:
+        self.env: Environment = env if env is not None else {}
+        self.parse = parse
+        self.formulas: dict[str, Compiled] = {}
+        # the variables each formula reads, and the formulas reading each variable
+        self.reads: dict[str, set[str]] = {}
+        self.readers: dict[str, set[str]] = {}
+        self.failed: dict[str, str] = {}
+
+    def run(self, command: str) -> list[str]:
+        """
+        :param command str: the command to be interpreted
+        :return list[str]: the variables that were recomputed, in order
+        :raises: Error, KeyError, ValueError or ArithmeticError if the command
+                 fails, in which case nothing is recomputed
+        """
+
+        ast = self.parse(command)
+
+        match ast.node_type:
+            case NodeType.ASSIGNMENT:
+                return self.define(str(ast.value), ast)
+            case NodeType.BEG:
+                variable = str(ast.value)
+                return self.bind(variable, inputs.read(variable))
+            case _:
+                evaluator(ast, self.env)
+                return []
+
+    def define(self, variable: str, ast: Node) -> list[str]:
+        """
+        Makes an assignment the formula of its variable, and recomputes the
+        formulas depending on the variable. An assignment reading its own
+        variable is run once instead, and its result bound to the variable.
+        """
+
+        reads = variables(ast.children[0])
+        slots = self.env if type(self.env) is SlotEnvironment else None
+        formula = compiler(ast, slots)
+
+        if variable in reads:
+            formula(self.env)
+            return self.bind(variable, self.env[variable])
+
+        self._check_cycle(variable, reads)
+        formula(self.env)
+
+        self._forget(variable)
+        self.formulas[variable] = formula
+        self.reads[variable] = reads
+        for name in reads:
+            self.readers.setdefault(name, set()).add(variable)
+
+        self.failed.pop(variable, None)
+        return self._propagate(variable)
+
+    def bind(self, variable: str, value: int | float) -> list[str]:
+        """
+        Binds a variable to a value, dropping its formula, and recomputes the
+        formulas depending on the variable.
+        """
+
+        self._forget(variable)
+        self.env[variable] = value
+        self.failed.pop(variable, None)
+        return self._propagate(variable)
+
+    def _forget(self, variable: str):
+        self.formulas.pop(variable, None)
+        for name in self.reads.pop(variable, ()):
+            self.readers[name].discard(variable)
+
+    def _check_cycle(self, variable: str, reads: set[str]):
+        # searches the formulas read by the new formula for the variable
+        parents: dict[str, str] = {name: variable for name in reads}
+        stack = list(reads)
+
+        while stack:
+            name = stack.pop()
+
+            if name == variable:
+                path = [variable]
+                name = parents[variable]
+                while name != variable:
+                    path.append(name)
+                    name = parents[name]
+                path.append(variable)
+                raise Error(f"Cyclic dependency: {' -> '.join(path)}")
+
+            for read in self.reads.get(name, ()):
+                if read not in parents:
+                    parents[read] = name
+                    stack.append(read)
+
+    def _propagate(self, changed: str) -> list[str]:
+        affected: set[str] = set()
+        stack = [changed]
+
+        while stack:
+            for reader in self.readers.get(stack.pop(), ()):
+                if reader not in affected:
+                    affected.add(reader)
+                    stack.append(reader)
+
+        # the number of variables each formula waits for
+        pending = {
+            name: sum(read in affected for read in self.reads[name])
+            for name in affected
+        }
+        ready = [name for name, count in pending.items() if count == 0]
+        order = []
+
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            self._recompute(name)
+
+            for reader in self.readers.get(name, ()):
+                pending[reader] -= 1
+                if pending[reader] == 0:
+                    ready.append(reader)
+
+        if len(order) != len(affected):
+            cycle = sorted(name for name, count in pending.items() if count)
+            raise Error(f"Cyclic dependency between {', '.join(cycle)}")
+
+        return order
+
+    def _recompute(self, variable: str):
+        try:
+            self.formulas[variable](self.env)
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            self.failed[variable] = describe(e)
+            self.env.pop(variable, None)
+        else:
+            self.failed.pop(variable, None)
+
+
+def variables(ast: Node | None) -> set[str]:
+    """
+    :return set[str]: the variables read by an expression
+    """
+
+    names = set()
+    stack = [ast]
+
+    while stack:
+        node = stack.pop()
+
+        if node is None or node.number is not None:
+            continue
+
+        if node.op is not None or node.value is None or str(node.value) == "None":
+            stack.extend(node.children)
+        else:
+            names.add(str(node.value).removeprefix("-"))
+
+    return names
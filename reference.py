@@ -0,0 +1,333 @@
+"""
+A frozen copy of the original lexer, parser and evaluator, kept as the
+reference of the conformance harness, see `conformance.py`.
+
+The interpreter's own front end and evaluator have been rewritten for speed,
+so they cannot serve as the reference for their own behavior. This module
+must not be changed along with them. The only departures from the original
+are that PRINT and BEG go through the `output` and `inputs` modules, so the
+harness can record and feed them, and that nodes are a class of their own,
+independent of `interfaces.Node`.
+"""
+
+import re
+from typing import TypeAlias
+
+import inputs
+import output
+from interfaces import Environment, Error
+
+NUMBER = r"\d+\.?\d*"
+VARIABLE = r"[a-zA-Z]+[0-9a-zA-Z]*"
+OPERATOR = r"[=+-/*%]"
+
+Token: TypeAlias = tuple[str, str]
+Command: TypeAlias = list[Token]
+
+
+class Node:
+    def __init__(self, value: str | None, node_type: str, children=[]) -> None:
+        self.value = value
+        self.node_type = node_type
+        self.children = children
+
+
+# ########################################################################
+# Lexer
+
+
+def lexer(command: str) -> list[Token]:
+    definitions = "|".join(["BEG", "PRINT", "EXIT!", NUMBER, VARIABLE, OPERATOR, r"\S"])
+    pattern = re.compile(rf"{definitions}")
+
+    tokens = re.findall(pattern, command)
+
+    return _tokenize(tokens)
+
+
+def _tokenize(tokens: list[str]) -> list[Token]:
+    def helper(token: str) -> Token:
+        if re.match(NUMBER, token):
+            return ("NUMBER", token)
+        elif re.match(r"BEG|PRINT|EXIT!|=", token):
+            return ("KEYWORD", token)
+        elif re.match(r"[+-]", token):
+            return ("PRECEDENCE 1", token)
+        elif re.match(r"[*/%]", token):
+            return ("PRECEDENCE 2", token)
+        elif re.match(r"[()]", token):
+            return ("PRECEDENCE 3", token)
+        elif re.match(VARIABLE, token):
+            return ("VARIABLE", token)
+        else:
+            raise Error(f"Invalid token: {token}")
+
+    tokenized = [helper(token) for token in tokens]
+    tokenized.append(("EOF", "0"))
+
+    return tokenized
+
+
+# ########################################################################
+# Parser
+
+
+def parser(tokens: Command) -> Node:
+    return _parse_command(tokens)
+
+
+def _parse_command(command: Command) -> Node:
+    ast: Node | None = (
+        _parse_assignment(command)
+        or _parse_output(command)
+        or _parse_exit(command)
+        or _parse_expression(command)
+    )
+
+    if not ast:
+        raise Error("Invalid command")
+
+    if command[0] != ("EOF", "0"):
+        raise Error("Parser failed to reach end of line")
+
+    return ast
+
+
+def _parse_expression(expression: list[Token]) -> Node | None:
+    left = _parse_term(expression) or None
+
+    # if left is not a term, return None
+    if not left:
+        return
+
+    while expression[0][0] == "PRECEDENCE 1" and expression[1][0] == "PRECEDENCE 1":
+        while expression[0][1] == "+" and expression[1][0] == "PRECEDENCE 1":
+            del expression[0]
+        while expression[0][1] == "-" and expression[1][0] == "PRECEDENCE 1":
+            del expression[1]
+            if expression[0][1] == "-":
+                del expression[0]
+                expression.insert(0, ("PRECEDENCE 1", "+"))
+
+    while expression[0][0] == "PRECEDENCE 1":
+        operator = expression[0][1]
+
+        del expression[0]
+
+        right = _parse_term(expression)
+
+        left = Node(operator, "EXPRESSION", [left, right])
+
+    return left
+
+
+def _parse_term(term) -> Node | None:
+    left = _parse_factor(term) or None
+
+    # if left is not a factor, return None
+    if not left:
+        return
+
+    while term[0][0] == "PRECEDENCE 2":
+        operator = term[0][1]
+        del term[0]
+
+        right = _parse_factor(term)
+
+        left = Node(operator, "TERM", [left, right])
+
+    return left
+
+
+def _parse_factor(factor) -> Node | None:
+    if factor[0] == ("PRECEDENCE 3", "("):
+        del factor[0]  # remove left parenthesis
+        result = _parse_expression(factor)
+        if factor[0] != ("PRECEDENCE 3", ")"):
+            raise Error("Expected right parenthesis")
+        del factor[0]  # remove right parenthesis
+        result = Node(None, "FACTOR", [result])
+        return result
+
+    elif (
+        factor[0][0] == "PRECEDENCE 1"
+        and factor[1][0] == "NUMBER"
+        or factor[1][0] == "VARIABLE"
+    ):
+        result = Node(("" if factor[0][1] == "+" else "-") + factor[1][1], "FACTOR")
+        del factor[0]
+        del factor[0]
+        return result
+
+    elif factor[0][0] == "NUMBER" or factor[0][0] == "VARIABLE":
+        result = Node(factor[0][1], "FACTOR")
+        del factor[0]
+        return result
+    # edge case falls off and returns None
+
+
+def _parse_assignment(assignment) -> Node | None:
+    if assignment[0] == ("KEYWORD", "BEG") and assignment[1][0] == "VARIABLE":
+        del assignment[0]
+        result = Node(assignment[0][1], "BEG")
+        del assignment[0]
+        return result
+    elif assignment[0][0] != "VARIABLE" or assignment[1] != ("KEYWORD", "="):
+        return
+
+    variable = assignment[0][1]
+    del assignment[0]
+    del assignment[0]  # remove equal sign
+
+    expression = _parse_expression(assignment)
+
+    return Node(variable, "ASSIGNMENT", [expression])
+
+
+def _parse_output(output) -> Node | None:
+    if output[0] != ("KEYWORD", "PRINT"):
+        return
+
+    del output[0]  # remove print keyword
+
+    if output[0][0] == "NUMBER" or output[0][0] == "VARIABLE":
+        result = Node(output[0][0], "OUTPUT", [output[0][1]])
+        del output[0]
+        return result
+
+
+def _parse_exit(cmd) -> Node | None:
+    if cmd[0] != ("KEYWORD", "EXIT!"):
+        return
+    del cmd[0]
+    return Node(None, "EXIT")
+
+
+# ########################################################################
+# Evaluator
+
+
+def evaluator(ast: Node, env: Environment):
+    match ast.node_type:
+        case "EXIT":
+            return _evaluate_exit()
+        case "BEG":
+            return _evaluate_beg(str(ast.value), env)
+        case "OUTPUT":
+            return _evaluate_output(str(ast.value), ast.children[0], env)
+        case "EXPRESSION":
+            return _evaluate_expression(ast, env)
+        case "TERM":
+            return _evaluate_term(ast, env)
+        case "FACTOR":
+            return _evaluate_factor(ast, env)
+        case "ASSIGNMENT":
+            return _evaluate_assignment(str(ast.value), ast.children[0], env)
+
+
+def _evaluate_expression(ast: Node, env: Environment) -> int | float:
+    if not ast:
+        raise Error("Cannot evaluate expression")
+
+    match ast.value:
+        case "+":
+            op1 = _evaluate_expression(ast.children[0], env)
+            op2 = _evaluate_term(ast.children[1], env)
+
+            if type(op1) != type(op2):
+                raise Error(f"Cannot add {type(op1)} to {type(op2)}. Type mismatch.")
+
+            return op1 + op2
+        case "-":
+            op1 = _evaluate_expression(ast.children[0], env)
+            op2 = _evaluate_term(ast.children[1], env)
+
+            if type(op1) != type(op2):
+                raise Error(
+                    f"Cannot subtract {type(op1)} to {type(op2)}. Type mismatch."
+                )
+
+            return op1 - op2
+        case _:
+            return _evaluate_term(ast, env)
+
+
+def _evaluate_term(ast: Node, env: Environment) -> int | float:
+    if not ast:
+        raise Error("Cannot evaluate term")
+
+    match ast.value:
+        case "*":
+            op1 = _evaluate_term(ast.children[0], env)
+            op2 = _evaluate_factor(ast.children[1], env)
+
+            if type(op1) != type(op2):
+                raise Error(
+                    f"Cannot multiply {type(op1)} to {type(op2)}. Type mismatch."
+                )
+
+            return op1 * op2
+        case "/":
+            op1 = _evaluate_term(ast.children[0], env)
+            op2 = _evaluate_factor(ast.children[1], env)
+
+            if type(op1) != type(op2):
+                raise Error(f"Cannot divide {type(op1)} to {type(op2)}. Type mismatch.")
+
+            if type(op1) == type(0):
+                return op1 // op2
+            return op1 / op2
+        case "%":
+            op1 = _evaluate_term(ast.children[0], env)
+            op2 = _evaluate_factor(ast.children[1], env)
+
+            if type(op1) != type(op2):
+                raise Error(f"Cannot modulo {type(op1)} to {type(op2)}. Type mismatch.")
+
+            return op1 % op2
+        case _:
+            return _evaluate_factor(ast, env)
+
+
+def _evaluate_factor(ast: Node, env: Environment) -> int | float:
+    if not ast:
+        raise Error("Cannot evaluate factor")
+
+    val = str(ast.value)
+
+    try:
+        return int(str(val))
+    except ValueError:
+        try:
+            return float(str(val))
+        except ValueError:
+            if val == "None":
+                return _evaluate_expression(ast.children[0], env)
+            if val[0] == "-":
+                return -env[val[1:]]
+            return env[val]
+
+
+def _evaluate_assignment(variable: str, value: Node, env: Environment):
+    res: int | float
+    try:
+        res = int(_evaluate_expression(value, env))
+    except ValueError:
+        res = float(_evaluate_expression(value, env))
+    env[variable] = res
+
+
+def _evaluate_output(output_type: str, value: str, env: Environment):
+    if output_type == "VARIABLE":
+        output.write(str(env[value]))
+        return
+    output.write(str(value))
+
+
+def _evaluate_beg(variable: str, env: Environment):
+    env[variable] = inputs.read(variable)
+
+
+def _evaluate_exit():
+    output.write("\nExiting SNOL Program...")
+    exit(0)
@@ -0,0 +1,181 @@
+"""
+Runs many independent SNOL scripts across a pool of worker processes.
+
+    python runner.py scripts/ -o results.jsonl
+    python runner.py manifest.txt --workers 8 --timeout 5
+
+Each script runs in its own environment with its output captured, and one
+JSON line is written per script, in the order the scripts were given. Worker
+processes are reused between scripts, so the interpreter is only imported
+once per worker and its parse cache stays warm.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from environment import SlotEnvironment
+from main import run_script
+
+
+class ScriptTimeout(Exception):
+    pass
+
+
+def find_scripts(path: str) -> list[str]:
+    """
+    Lists the scripts to run, either the `.snol` files of a directory, or the
+    paths listed one per line in a manifest file, relative to the manifest.
+    """
+
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.endswith(".snol")
+        )
+
+    directory = os.path.dirname(path)
+
+    with open(path) as manifest:
+        return [
+            os.path.join(directory, line.strip()) for line in manifest if line.strip()
+        ]
+
+
+def run_one(path: str, timeout: float | None = None) -> dict:
+    """
+    Runs a single script in a fresh environment. BEG has no input to read
+    from, so scripts that use it fail.
+
+    :return dict: the result of the script, with its exit code, captured
+                  output and errors, and final variables
+    """
+
+    env = SlotEnvironment()
+    output = io.StringIO()
+    errors = io.StringIO()
+    result: dict = {"script": path}
+    start = time.perf_counter()
+
+    try:
+        # the timer is disarmed inside the guarded block, so an alarm raised
+        # just as the script finishes is still caught as a timeout
+        try:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+
+            with open(path) as script, contextlib.redirect_stdout(
+                output
+            ), contextlib.redirect_stderr(errors):
+                result["status"] = run_script(script, env)
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except ScriptTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result["status"] = "crashed"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.perf_counter() - start
+    result["output"] = output.getvalue()
+    result["errors"] = errors.getvalue()
+    result["env"] = dict(env)
+
+    return result
+
+
+def encode(result: dict) -> str:
+    """
+    Writes a result as a line of standard JSON. Variables holding infinite or
+    NaN floats are written as strings, as PRINT writes them, and ints with too
+    many digits to be written in decimal are written as hexadecimal strings.
+
+    :return str: the JSON line, without its newline
+    """
+
+    env = {variable: _encode_value(value) for variable, value in result["env"].items()}
+    return json.dumps(result | {"env": env}, allow_nan=False)
+
+
+def _encode_value(value: int | float) -> int | float | str:
+    if isinstance(value, float):
+        return value if math.isfinite(value) else str(value)
+
+    try:
+        str(value)
+    except ValueError:
+        return hex(value)
+    return value
+
+
+def _initialize():
+    """
+    Prepares a worker process. Scripts cannot read from the terminal, and
+    timeouts are raised from the alarm signal.
+    """
+
+    sys.stdin = io.StringIO()
+    signal.signal(signal.SIGALRM, _raise_timeout)
+
+
+def _raise_timeout(signum, frame):
+    raise ScriptTimeout()
+
+
+def _run(arguments: tuple[str, float | None]) -> dict:
+    return run_one(*arguments)
+
+
+def run_many(
+    paths: Iterable[str],
+    workers: int | None = None,
+    timeout: float | None = None,
+    chunksize: int = 16,
+) -> Iterator[dict]:
+    """
+    Runs the scripts across a pool of worker processes.
+
+    :param workers int | None: the number of processes, the number of CPUs
+                               by default
+    :param timeout float | None: the number of seconds a script may run
+    :param chunksize int: the number of scripts sent to a worker at once
+    :return Iterator[dict]: the result of each script, in order
+    """
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialize) as pool:
+        tasks = ((path, timeout) for path in paths)
+        yield from pool.map(_run, tasks, chunksize=chunksize)
+
+
+def main():
+    arguments = argparse.ArgumentParser(description="Run many SNOL scripts")
+    arguments.add_argument("scripts", help="a directory of scripts, or a manifest")
+    arguments.add_argument("-o", "--output", help="the JSONL file to write to")
+    arguments.add_argument("-j", "--workers", type=int, help="number of processes")
+    arguments.add_argument("--timeout", type=float, help="seconds per script")
+    args = arguments.parse_args()
+
+    failed = 0
+
+    with (
+        open(args.output, "w") if args.output else contextlib.nullcontext(sys.stdout)
+    ) as results:
+        for result in run_many(find_scripts(args.scripts), args.workers, args.timeout):
+            failed += result["status"] != 0
+            results.write(encode(result) + "\n")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Serves concurrent SNOL sessions over TCP or a Unix socket.
+
+    python server.py --port 4000
+    python server.py --unix /tmp/snol.sock
+
+Each connection is a session with its own environment, speaking the same line
+based protocol as the terminal: the server sends a prompt, the client sends a
+command. BEG asks the client for the value instead of blocking on input().
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+
+from environment import SlotEnvironment
+from interfaces import Error, Node, NodeType, describe
+from main import execute, parse
+
+PROMPT = "\nSNOL $> "
+
+
+class Server:
+    """
+    Accepts sessions up to `max_sessions` at once. A session is closed after
+    `idle_timeout` seconds without a command, and cannot define more than
+    `max_variables` variables or send lines longer than `max_line` bytes.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        idle_timeout: float = 300,
+        max_variables: int = 10_000,
+        max_line: int = 64 * 1024,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_variables = max_variables
+        self.max_line = max_line
+        self.sessions = 0
+
+    async def start_tcp(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self.handle, host, port, limit=self.max_line)
+
+    async def start_unix(self, path: str) -> asyncio.Server:
+        return await asyncio.start_unix_server(self.handle, path, limit=self.max_line)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.sessions >= self.max_sessions:
+            writer.write(b"Error: Too many sessions, try again later\n")
+            await _close(writer)
+            return
+
+        self.sessions += 1
+        try:
+            await Session(self, reader, writer).run()
+        finally:
+            self.sessions -= 1
+            await _close(writer)
+
+
+class Session:
+    def __init__(
+        self, server: Server, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.env = SlotEnvironment()
+
+    async def run(self):
+        await self.write(
+            "The SNOL Environment is now active, you may proceed with giving your"
+            " commands\n"
+        )
+
+        while True:
+            await self.write(PROMPT)
+
+            command = await self.readline()
+            if command is None:
+                return
+
+            if not await self.interpret(command):
+                return
+
+    async def readline(self) -> str | None:
+        """
+        :return str | None: the next line sent by the client, or None if the
+                            client left or was idle for too long
+        """
+
+        try:
+            line = await asyncio.wait_for(
+                self.reader.readline(), self.server.idle_timeout
+            )
+        except asyncio.TimeoutError:
+            await self.write("\nSession closed after being idle\n")
+            return None
+        except ValueError:
+            await self.write("\nError: Line is too long\n")
+            return None
+
+        if not line:
+            return None
+        return line.decode(errors="replace").strip()
+
+    async def write(self, text: str):
+        self.writer.write(text.encode())
+        # waits for the client to keep up before producing more output
+        await self.writer.drain()
+
+    async def interpret(self, command: str) -> bool:
+        """
+        Interprets a command like `main.interpret`, writing its output and
+        errors to the client.
+
+        :return bool: False if the session should end
+        """
+
+        try:
+            ast = parse(command)
+
+            match ast.node_type:
+                case NodeType.EXIT:
+                    await self.write("\nExiting SNOL Program...\n")
+                    return False
+                case NodeType.BEG:
+                    return await self.beg(str(ast.value))
+
+            self.check_variables(ast)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                execute(command, ast, self.env)
+            await self.write(output.getvalue())
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            await self.write(f"Error: {describe(e)}\n")
+
+        return True
+
+    async def beg(self, variable: str) -> bool:
+        self.check_variables(Node(variable, NodeType.BEG))
+
+        await self.write(f"\nProvide a value for variable {variable} >> ")
+
+        value = await self.readline()
+        if value is None:
+            return False
+
+        try:
+            self.env[variable] = int(value)
+        except ValueError:
+            self.env[variable] = float(value)
+
+        return True
+
+    def check_variables(self, ast: Node):
+        if ast.node_type not in (NodeType.ASSIGNMENT, NodeType.BEG):
+            return
+
+        if ast.value not in self.env and len(self.env) >= self.server.max_variables:
+            raise Error(f"Too many variables, the limit is {self.server.max_variables}")
+
+
+async def _close(writer: asyncio.StreamWriter):
+    writer.close()
+    with contextlib.suppress(ConnectionError):
+        await writer.wait_closed()
+
+
+async def serve(args: argparse.Namespace):
+    server = Server(args.max_sessions, args.idle_timeout, args.max_variables)
+
+    if args.unix:
+        listener = await server.start_unix(args.unix)
+    else:
+        listener = await server.start_tcp(args.host, args.port)
+
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    arguments = argparse.ArgumentParser(description="Serve SNOL sessions")
+    arguments.add_argument("--host", default="127.0.0.1")
+    arguments.add_argument("--port", type=int, default=4000)
+    arguments.add_argument("--unix", help="listen on a Unix socket instead")
+    arguments.add_argument("--max-sessions", type=int, default=256)
+    arguments.add_argument("--idle-timeout", type=float, default=300)
+    arguments.add_argument("--max-variables", type=int, default=10_000)
+    asyncio.run(serve(arguments.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Saves an environment to a compact binary file, and restores it.
+
+    header   magic, version, byte order, and the number of ints, floats,
+             ints too large for 64 bits, and bytes of text
+    ints     the int64 values
+    floats   the float64 values
+    text     the names of the int, float and large int variables, followed
+             by the digits of the large ints, separated by NUL bytes
+
+Ints and floats are stored apart, so every value is restored with its type.
+The file is mapped in memory when restored, and the arrays are converted to
+Python values in bulk rather than one variable at a time.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from interfaces import Environment, Error
+
+MAGIC = b"SNOLENV\0"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIB3xQQQQ")
+_INT_MIN, _INT_MAX = -(2**63), 2**63 - 1
+
+
+def save(env: Environment, path: str):
+    """
+    Writes the variables of an environment to a file, replacing it at once
+    so that a failed save leaves the previous snapshot intact.
+    """
+
+    int_names, ints = [], array("q")
+    float_names, floats = [], array("d")
+    big_names, bigs = [], []
+
+    for name, value in env.items():
+        if "\0" in name:
+            raise Error(f"Cannot save variable {name!r}")
+
+        if type(value) == float:
+            float_names.append(name)
+            floats.append(value)
+        elif _INT_MIN <= value <= _INT_MAX:
+            int_names.append(name)
+            ints.append(value)
+        else:
+            big_names.append(name)
+            bigs.append(str(value))
+
+    text = "\0".join(int_names + float_names + big_names + bigs).encode()
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        sys.byteorder == "little",
+        len(ints),
+        len(floats),
+        len(bigs),
+        len(text),
+    )
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        with open(temporary, "wb") as file:
+            file.write(header)
+            file.write(ints.tobytes())
+            file.write(floats.tobytes())
+            file.write(text)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def load(path: str, env: Environment | None = None) -> Environment:
+    """
+    Reads the variables saved in a file.
+
+    :param env Environment: the environment to restore the variables into, a
+                            new dict by default
+    :return Environment: the environment holding the restored variables
+    :raises: Error if the file is not a snapshot
+    """
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < _HEADER.size:
+            raise Error(f"{path} is not an environment snapshot")
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                variables = _decode(view)
+            finally:
+                view.release()
+
+    if env is None:
+        return variables
+
+    env.update(variables)
+    return env
+
+
+def _decode(data: memoryview) -> dict[str, int | float]:
+    magic, version, little, int_count, float_count, big_count, text_size = (
+        _HEADER.unpack_from(data)
+    )
+
+    if magic != MAGIC:
+        raise Error("The file is not an environment snapshot")
+    if version != VERSION:
+        raise Error(f"Cannot restore a snapshot of version {version}")
+
+    start = _HEADER.size
+    end = start + 8 * (int_count + float_count) + text_size
+
+    if len(data) != end:
+        raise Error("The environment snapshot is truncated")
+
+    ints, floats = array("q"), array("d")
+    ints.frombytes(data[start : start + 8 * int_count])
+    start += 8 * int_count
+    floats.frombytes(data[start : start + 8 * float_count])
+    start += 8 * float_count
+
+    if little != (sys.byteorder == "little"):
+        ints.byteswap()
+        floats.byteswap()
+
+    text = str(data[start:end], "utf-8").split("\0") if text_size else []
+
+    if len(text) != int_count + float_count + 2 * big_count:
+        raise Error("The environment snapshot is corrupted")
+
+    floats_start = int_count
+    bigs_start = floats_start + float_count
+    digits_start = bigs_start + big_count
+
+    variables: dict[str, int | float] = dict(zip(text[:floats_start], ints.tolist()))
+    variables.update(zip(text[floats_start:bigs_start], floats.tolist()))
+    variables.update(zip(text[bigs_start:digits_start], map(int, text[digits_start:])))
+
+    return variables
@@ -4,6 +4,40 @@ from evaluator import evaluator
 from interfaces import Node, Environment
 from unittest.mock import patch
 from parser import parser
+from main import run_script
+from compiler import compiler, TieredEvaluator
+from cache import ParseCache
+from optimizer import optimizer
+from environment import SlotEnvironment, ForkableEnvironment, MAX_LAYERS
+import vm
+import runner
+import server
+import asyncio
+import benchmark
+import main
+from instrumentation import Instruments
+import inputs
+import snapshot
+import inference
+import api
+import output
+import conformance
+import dataflow
+from reactive import ReactiveScript
+from tokenizer import tokenize_file
+import io
+import json
+import os
+import pickle
+import random
+import signal
+import tempfile
+
+try:
+    import numpy as np
+    from vectorized import batch_evaluator, load_columns
+except ImportError:
+    np = None
 
 
 class TestLexer(unittest.TestCase):
@@ -43,11 +77,29 @@ class TestLexer(unittest.TestCase):
             result, expected_output, "Lexer can't tokenize operators correctly"
         )
 
+    def test_lexer_with_number_values(self):
+        int_token, float_token, _ = lexer("12 3.5")
+        self.assertEqual(int_token.number, 12, "Lexer can't parse int values")
+        self.assertEqual(float_token.number, 3.5, "Lexer can't parse float values")
+        self.assertIs(type(float_token.number), float)
+
+    def test_number_tokens_are_pairs(self):
+        token = lexer("12")[0]
+        self.assertFalse(hasattr(token, "__dict__"), "Tokens carry a dictionary")
+        self.assertEqual(
+            (len(token), list(token), hash(token)),
+            (2, ["NUMBER", "12"], hash(("NUMBER", "12"))),
+        )
+        self.assertEqual(pickle.loads(pickle.dumps(token)).number, 12)
+
     def test_lexer_with_invalid_token(self):
         command = "#"
         with self.assertRaises(Error, msg="Lexer can tokenize invalid tokens"):
             lexer(command)
 
+        with self.assertRaisesRegex(Error, "Invalid token: \\$ at column 7"):
+            lexer("x = 1 $ 2")
+
 
 class TestParser(unittest.TestCase):
     def test_parse_assignment(self):
@@ -131,6 +183,37 @@ class TestParser(unittest.TestCase):
             ast, expected_ast, "Parser can't parse complex expressions correctly"
         )
 
+    def test_parse_numbers_once(self):
+        tokens = lexer("x = 5 * -2.5 * +3")
+        with patch("interfaces.to_number", side_effect=AssertionError):
+            ast = parser(tokens)
+
+        product, right = ast.children[0].children
+        numbers = [node.number for node in (*product.children, right)]
+        self.assertEqual(numbers, [5, -2.5, 3])
+        self.assertEqual([type(number) for number in numbers], [int, float, int])
+
+    def test_parse_keeps_tokens(self):
+        tokens = lexer("x = 5 - - 3")
+        expected_tokens = list(tokens)
+        parser(tokens)
+        self.assertEqual(tokens, expected_tokens, "Parser modifies its input")
+
+    def test_parse_long_expression(self):
+        tokens = lexer(" + ".join(["1"] * 100_000))
+        ast = parser(tokens)
+        self.assertEqual(evaluator(ast, {}), 100_000)
+
+    def test_parse_deep_nesting(self):
+        depth = 100_000
+        tokens = lexer("y = " + "(" * depth + "x" + " * 2 - 1)" * depth)
+        env: Environment = {"x": 1}
+        evaluator(parser(tokens), env)
+        self.assertEqual(env["y"], 1, "Parser can't handle deep nesting")
+
+        with self.assertRaises(Error, msg="Parser accepts unbalanced nesting"):
+            parser(lexer("(" * depth + "x" + ")" * (depth - 1)))
+
 
 class TestEvaluator(unittest.TestCase):
     def test_evaluate_expression(self):
@@ -149,6 +232,18 @@ class TestEvaluator(unittest.TestCase):
         with self.assertRaises(Error, msg="Evaluator can't handle type errors"):
             evaluator(ast, env)
 
+    def test_evaluate_deep_tree(self):
+        ast = Node("1", "FACTOR")
+        for _ in range(100_000):
+            ast = Node(
+                None, "FACTOR", [Node("+", "EXPRESSION", [Node("1", "FACTOR"), ast])]
+            )
+        self.assertEqual(evaluator(ast, {}), 100_001)
+
+        env: Environment = {}
+        run_script(["x = " + "(1 + " * 5000 + "1" + ")" * 5000] * 10, env)
+        self.assertEqual(env["x"], 5001, "Interpreter can't run deeply nested commands")
+
     def test_evaluate_term(self):
         env: Environment = {}
         ast = Node("*", "TERM", [Node("2", "FACTOR", []), Node("3", "FACTOR", [])])
@@ -186,5 +281,935 @@ class TestEvaluator(unittest.TestCase):
             evaluator(ast, env)
 
 
+class TestCompiler(unittest.TestCase):
+    def test_compile_expression(self):
+        env: Environment = {"x": 4, "y": 2.5}
+        for command in ["5 + 3 * (4 + 2 * 3)", "x / 3 - -x % 3", "y * 2.0 / 4.0"]:
+            ast = parser(lexer(command))
+            self.assertEqual(
+                compiler(ast)(env),
+                evaluator(ast, env),
+                f"Compiled {command} differs from the evaluator",
+            )
+
+    def test_compile_type_error(self):
+        env: Environment = {"x": 5.0}
+        compiled = compiler(parser(lexer("2 + x")))
+        with self.assertRaises(Error, msg="Compiler can't handle type errors"):
+            compiled(env)
+
+    def test_compile_assignment(self):
+        env: Environment = {"x": 3}
+        compiler(parser(lexer("y = x * 2 + 1")))(env)
+        self.assertEqual(env["y"], 7, "Compiler can't compile assignments correctly")
+
+    def test_compile_slots(self):
+        env = SlotEnvironment({"x": 3})
+        compiler(parser(lexer("y = -x * 2 + x")), slots=env)(env)
+        self.assertEqual(env["y"], -3, "Compiler can't access variables by slot")
+
+        with self.assertRaises(KeyError):
+            compiler(parser(lexer("z + 1")), slots=env)(env)
+
+    def test_compile_incomplete(self):
+        # the undefined `y` fails before the empty operand, as in the evaluator
+        compiled = compiler(parser(lexer("x = (y + ())")))
+        with self.assertRaises(KeyError):
+            compiled({})
+        with self.assertRaises(Error):
+            compiled({"y": 1})
+
+    def test_tiered_evaluator(self):
+        env: Environment = {"x": 0}
+        execute = TieredEvaluator(threshold=2)
+        ast = parser(lexer("x = x + 1"))
+        for _ in range(5):
+            execute("x = x + 1", ast, env)
+        self.assertEqual(env["x"], 5)
+        self.assertIn("x = x + 1", execute.compiled, "Hot command isn't compiled")
+
+    def test_tiered_counts_are_bounded(self):
+        execute = TieredEvaluator(threshold=2, size=5, counts_size=10)
+        for value in range(100):
+            command = f"x = {value}"
+            for _ in range(value % 2 * 3 + 1):
+                execute(command, parser(lexer(command)), {})
+        self.assertLessEqual(len(execute.counts), 10, "Cold commands pile up")
+        self.assertEqual(len(execute.compiled), 5, "Compiled commands pile up")
+        self.assertIn("x = 99", execute.compiled)
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_fold_constants(self):
+        ast = optimizer(parser(lexer("x = (3 * 4) + 2 * (10 - 1)")))
+        self.assertEqual(ast, Node("x", "ASSIGNMENT", [Node("30", "FACTOR")]))
+
+    def test_fold_keeps_int_division(self):
+        ast = optimizer(parser(lexer("7 / 2")))
+        self.assertEqual(ast, Node("3", "FACTOR"), "Optimizer doesn't floor ints")
+
+        ast = optimizer(parser(lexer("7.0 / 2.0")))
+        self.assertEqual(ast, Node("3.5", "FACTOR"))
+
+    def test_fold_type_error(self):
+        with self.assertRaises(Error, msg="Optimizer can't handle type errors"):
+            optimizer(parser(lexer("x = 2 * 2.0 + y")))
+        with self.assertRaises(Error, msg="Optimizer can't handle type errors"):
+            optimizer(parser(lexer("x = 1 - (3 + 2 * 2.0)")))
+
+        # the evaluator fails on the undefined `y` before the mismatch
+        ast = optimizer(parser(lexer("x = y + 2 * 2.0")))
+        self.assertEqual(ast, parser(lexer("x = y + 2 * 2.0")))
+        with self.assertRaises(KeyError):
+            evaluator(ast, {})
+
+    def test_remove_parentheses(self):
+        ast = optimizer(parser(lexer("(x * y) + (z)")))
+        expected_ast = parser(lexer("x * y + z"))
+        self.assertEqual(ast, expected_ast, "Optimizer keeps redundant parentheses")
+
+        ast = optimizer(parser(lexer("x * (y + z)")))
+        self.assertEqual(ast, parser(lexer("x * (y + z)")))
+
+    def test_identities(self):
+        ast = optimizer(parser(lexer("(x + 2) * 1 - 0")))
+        self.assertEqual(ast, parser(lexer("x + 2")))
+
+        # the type of x is unknown, so `x * 1` may still be a type mismatch
+        ast = optimizer(parser(lexer("x * 1")))
+        self.assertEqual(ast, parser(lexer("x * 1")))
+
+
+class TestParseCache(unittest.TestCase):
+    def test_cache_hits(self):
+        cache = ParseCache(size=4)
+        ast = cache.parse("x = 5 + 3")
+        self.assertIs(cache.parse("x  =  5 + 3 "), ast, "Cache doesn't normalize")
+        self.assertEqual(ast, parser(lexer("x = 5 + 3")))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_cache_evictions(self):
+        cache = ParseCache(size=2)
+        for command in ["1", "2", "1", "3", "2"]:
+            cache.parse(command)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()["evictions"], 2, "Cache isn't LRU")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_cache_skips_errors(self):
+        cache = ParseCache()
+        with self.assertRaises(Error):
+            cache.parse("x = ")
+        self.assertEqual(len(cache), 0, "Cache stores invalid commands")
+
+
+class TestSlotEnvironment(unittest.TestCase):
+    def test_mapping(self):
+        env = SlotEnvironment({"x": 1, "y": 2.5})
+        env["z"] = 3
+        del env["x"]
+        self.assertEqual(env, {"y": 2.5, "z": 3})
+        self.assertNotIn("x", env)
+        self.assertEqual(len(env), 2)
+        with self.assertRaises(KeyError):
+            env["x"]
+
+    def test_evaluator(self):
+        env = SlotEnvironment({"x": 4})
+        evaluator(parser(lexer("y = x * -x")), env)
+        self.assertEqual(env["y"], -16, "Evaluator can't use slot environments")
+
+    def test_slots_per_environment(self):
+        SlotEnvironment({f"v{i}": i for i in range(1000)})
+        env = SlotEnvironment({"x": 1})
+        self.assertEqual(len(env.values), 1, "Slots are shared between environments")
+
+        # slots are resolved when compiling, and kept when a variable is deleted
+        compiled = compiler(parser(lexer("y = x + 1")), slots=env)
+        self.assertEqual(env.slots, {"x": 0, "y": 1})
+        self.assertEqual(dict(env), {"x": 1}, "Reserved slots define variables")
+        compiled(env)
+        del env["x"]
+        with self.assertRaises(KeyError):
+            compiled(env)
+        env["x"] = 5
+        compiled(env)
+
+        self.assertEqual(env.slots, {"x": 0, "y": 1})
+        self.assertEqual(dict(env), {"x": 5, "y": 6})
+        self.assertEqual(len(env), 2)
+
+    def test_tiered_slots(self):
+        execute = TieredEvaluator(threshold=0)
+        ast = parser(lexer("y = x + 1"))
+        env = SlotEnvironment({"x": 1})
+        other = SlotEnvironment({"y": 0, "x": 10})
+        plain: Environment = {"x": 100}
+
+        for target in (env, other, plain, env, other, plain):
+            execute("y = x + 1", ast, target)
+            target["x"] = target["y"]
+
+        self.assertEqual(dict(env), {"x": 3, "y": 3})
+        self.assertEqual(dict(other), {"y": 12, "x": 12})
+        self.assertEqual(plain, {"x": 102, "y": 102})
+        self.assertIs(execute.compiled["y = x + 1"][0], None)
+
+
+class TestForkableEnvironment(unittest.TestCase):
+    def test_fork(self):
+        base = ForkableEnvironment({"x": 1, "y": 2})
+        fork = base.fork()
+        fork["x"] = 10
+        del fork["y"]
+        base["z"] = 3
+
+        self.assertEqual(dict(base), {"x": 1, "y": 2, "z": 3})
+        self.assertEqual(dict(fork), {"x": 10}, "Fork isn't isolated")
+        with self.assertRaises(KeyError):
+            fork["y"]
+
+    def test_forks_share_layers(self):
+        base = ForkableEnvironment({f"v{i}": i for i in range(1000)})
+        forks = [base.fork() for _ in range(100)]
+        self.assertTrue(all(fork.shared is base.shared for fork in forks))
+
+        ast = parser(lexer("y = v1 + v999"))
+        for value, fork in enumerate(forks):
+            fork["v1"] = value
+            evaluator(ast, fork)
+        self.assertEqual(forks[7]["y"], 1006)
+        self.assertNotIn("y", base)
+
+    def test_layers_are_merged(self):
+        env = ForkableEnvironment({"x": 0}).fork()
+        base = env.shared
+        for value in range(MAX_LAYERS * 3):
+            env["x"] = value
+            env = env.fork()
+
+        self.assertLessEqual(env.shared.depth, MAX_LAYERS)
+        self.assertEqual((env["x"], len(env)), (MAX_LAYERS * 3 - 1, 1))
+
+        oldest = env.shared
+        while oldest.parent is not None:
+            oldest = oldest.parent
+        self.assertIs(oldest, base, "The base layer is copied by the merge")
+
+    def test_len(self):
+        rng = random.Random(0)
+        envs = [ForkableEnvironment({f"v{i}": i for i in range(1000)})]
+
+        for step in range(5000):
+            env = rng.choice(envs)
+            name = f"v{rng.randrange(1010)}"
+            action = rng.random()
+
+            if action < 0.05:
+                envs.append(env.fork())
+            elif action < 0.5 and name in env:
+                del env[name]
+            else:
+                env[name] = step
+
+        for env in envs:
+            self.assertEqual(len(env), len(list(env)), "Length is out of date")
+
+        with patch.object(ForkableEnvironment, "__iter__", side_effect=AssertionError):
+            self.assertEqual(len(envs[0].fork()), len(envs[0]))
+
+
+@unittest.skipUnless(np, "NumPy is not installed")
+class TestBatchEvaluator(unittest.TestCase):
+    def test_batch_expression(self):
+        columns = {"x": np.array([1, 2, 7]), "y": np.array([2, 0, -2])}
+        result = batch_evaluator(parser(lexer("x / y + x % 3")), columns)
+        self.assertEqual(result.failed.tolist(), [False, True, False])
+        self.assertEqual(result.values()[[0, 2]].tolist(), [1, -3])
+
+    def test_batch_type_error(self):
+        x = np.empty(3, object)
+        x[:] = [1, 2.5, None]
+        result = batch_evaluator(parser(lexer("x * 2")), {"x": x})
+        self.assertEqual(
+            result.failed.tolist(),
+            [False, True, True],
+            "Batch evaluator doesn't mask type errors and undefined variables",
+        )
+
+    def test_batch_assignment(self):
+        columns = {"x": np.array([2.5, -3.5])}
+        result = batch_evaluator(parser(lexer("y = x * 3.0")), columns)
+        self.assertEqual(result.values().tolist(), [7, -10])
+
+    def test_load_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bindings.csv")
+            with open(path, "w") as file:
+                file.write("x,y\n1,2.5\n3,\n")
+            columns = load_columns(path)
+        self.assertEqual(columns["x"].tolist(), [1, 3])
+        self.assertEqual(columns["y"].tolist(), [2.5, None])
+
+
+class TestVM(unittest.TestCase):
+    script = ["x = 5", "y = x * 2 - -x", "PRINT y", "z = x + 1.0", "PRINT 2.50"]
+
+    def test_run(self):
+        env: Environment = {}
+        program = vm.compile_script(self.script)
+        with patch("sys.stdout", new=io.StringIO()) as out, patch(
+            "sys.stderr", new=io.StringIO()
+        ) as err:
+            status = vm.run(program, env)
+        self.assertEqual(status, 1)
+        self.assertEqual(out.getvalue(), "15\n2.50\n", "VM doesn't match evaluator")
+        self.assertIn("Error on line 4: Cannot add", err.getvalue())
+        self.assertEqual(env, {"x": 5, "y": 15})
+
+    def test_disassemble(self):
+        listing = vm.disassemble(vm.compile_script(["x = y % 2"]))
+        self.assertIn("LOAD_VAR         0 (y)", listing)
+        self.assertIn("BINARY_MODULO", listing)
+        self.assertIn("STORE            1 (x)", listing)
+
+    def test_deep_expressions(self):
+        depth = 20_000
+        script = [
+            "y = " + " + ".join(["1"] * depth),
+            "z = " + "(" * depth + "x" + " * 2 - 1)" * depth,
+        ]
+        env: Environment = {"x": 1}
+
+        with patch("sys.stderr", new=io.StringIO()) as err:
+            status = vm.run(vm.compile_script(script), env)
+
+        self.assertEqual((status, err.getvalue()), (0, ""))
+        self.assertEqual(env, {"x": 1, "y": depth, "z": 1})
+
+    def test_load_script(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "script.snol")
+            with open(path, "w") as file:
+                file.write("\n".join(self.script))
+
+            program = vm.load_script(path)
+            self.assertTrue(os.path.exists(path + "c"), "VM doesn't cache scripts")
+
+            with patch("vm.compile_script") as compile_script:
+                cached = vm.load_script(path)
+            compile_script.assert_not_called()
+            self.assertEqual(cached.lines, program.lines)
+
+            with open(path, "a") as file:
+                file.write("\nPRINT x")
+            self.assertEqual(len(vm.load_script(path).lines), 6)
+
+
+class TestRunner(unittest.TestCase):
+    def test_run_many(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, script in [("a", "x = 2\nPRINT x"), ("b", "PRINT y")]:
+                with open(os.path.join(directory, f"{name}.snol"), "w") as file:
+                    file.write(script)
+
+            paths = runner.find_scripts(directory)
+            results = list(runner.run_many(paths, workers=2))
+
+        self.assertEqual([result["status"] for result in results], [0, 1])
+        self.assertEqual(results[0]["output"], "2\n")
+        self.assertEqual(results[0]["env"], {"x": 2})
+        self.assertEqual(results[1]["env"], {}, "Scripts share an environment")
+        self.assertIn("line 1", results[1]["errors"])
+
+    def test_late_timeout(self):
+        def setitimer(which, seconds):
+            if seconds == 0:
+                # the alarm goes off just before the timer is disarmed
+                runner._raise_timeout(signal.SIGALRM, None)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.snol")
+            with open(path, "w") as file:
+                file.write("x = 2")
+
+            with patch("signal.setitimer", setitimer):
+                result = runner.run_one(path, timeout=5)
+
+        self.assertEqual(result["status"], "timeout", "A late alarm crashes the worker")
+
+    def test_encode_non_finite(self):
+        result = {"script": "a.snol", "env": {"x": float("inf"), "y": float("nan")}}
+        line = runner.encode(result)
+
+        self.assertEqual(json.loads(line)["env"], {"x": "inf", "y": "nan"})
+        self.assertNotIn("Infinity", line)
+        self.assertEqual(result["env"]["x"], float("inf"), "Results are changed")
+
+    def test_encode_huge_int(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.snol")
+            with open(path, "w") as file:
+                file.write("x = 2\n" + "x = x * x\n" * 12)
+
+            [result] = runner.run_many([path], workers=1)
+
+        self.assertEqual(json.loads(runner.encode(result))["env"], {"x": 2**4096})
+
+        result["env"]["x"] = 10**5000
+        encoded = json.loads(runner.encode(result))["env"]["x"]
+        self.assertEqual(int(encoded, 16), 10**5000)
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = server.Server(max_sessions=2, idle_timeout=1, max_variables=2)
+        self.listener = await self.server.start_tcp("127.0.0.1", 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def session(self, *lines: str) -> str:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write("".join(f"{line}\n" for line in lines).encode())
+        await writer.drain()
+        output = await reader.read()
+        writer.close()
+        return output.decode()
+
+    async def test_session(self):
+        output = await self.session("BEG x", "4", "y = x * 2", "PRINT y", "EXIT!")
+        self.assertIn("Provide a value for variable x >> ", output)
+        self.assertIn("8\n", output)
+        self.assertIn("Exiting SNOL Program...", output)
+
+    async def test_sessions_are_isolated(self):
+        await self.session("x = 1", "EXIT!")
+        output = await self.session("PRINT x", "EXIT!")
+        self.assertIn("Error: Variable 'x' is not defined", output)
+
+    async def test_arithmetic_errors(self):
+        large = "1" + "0" * 200 + ".0"
+        output = await self.session(
+            "x = 1 / 0", f"y = {large} * {large}", "PRINT 5", "EXIT!"
+        )
+        self.assertIn("Error: integer division or modulo by zero", output)
+        self.assertIn("Error: cannot convert float infinity to integer", output)
+        self.assertIn("5\n", output)
+
+    async def test_limits(self):
+        output = await self.session("a = 1", "b = 2", "c = 3", "EXIT!")
+        self.assertIn("Error: Too many variables", output)
+
+        output = await self.session()
+        self.assertIn("Session closed after being idle", output)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_workloads(self):
+        for name, workload in benchmark.WORKLOADS.items():
+            script, bindings = workload()
+            env = SlotEnvironment(bindings)
+            with patch("sys.stdout", new=io.StringIO()), patch(
+                "sys.stderr", new=io.StringIO()
+            ) as err:
+                status = run_script(script, env)
+            self.assertEqual(status, 0, f"Workload {name} fails: {err.getvalue()}")
+
+    def test_compare(self):
+        baseline = {"flat/lexer": {"lines_per_second": 1000.0}}
+        results = {"flat/lexer": {"lines_per_second": 850.0}}
+        self.assertEqual(len(benchmark.compare(results, baseline, 0.1)), 1)
+        self.assertEqual(benchmark.compare(results, baseline, 0.2), [])
+
+    def test_end_to_end_restores_main(self):
+        cache, execute = main.cache, main.execute
+
+        benchmark._end_to_end(["x = 1"], {})
+        with patch("sys.stderr", new=io.StringIO()), self.assertRaises(Error):
+            benchmark._end_to_end(["PRINT y"], {})
+
+        self.assertIs(main.cache, cache, "Benchmark replaces the parse cache")
+        self.assertIs(main.execute, execute, "Benchmark replaces the evaluator")
+
+    def test_summarize(self):
+        summary = benchmark.summarize([0.001] * 9 + [0.005], lines=10)
+        self.assertAlmostEqual(summary["max_ms"], 5)
+        self.assertNotIn("p99_ms", summary)
+
+
+class TestInstruments(unittest.TestCase):
+    def test_profile(self):
+        instruments = Instruments()
+        script = ["x = 5", "y = x * 2", "y = z", "y = x * 2", "PRINT y"]
+        with patch.object(main, "instruments", instruments), patch.object(
+            main, "cache", None
+        ), patch("sys.stdout", new=io.StringIO()), patch(
+            "sys.stderr", new=io.StringIO()
+        ):
+            run_script(script, {})
+
+        profile = instruments.to_dict()
+        self.assertEqual(profile["counters"]["commands"], 5)
+        self.assertEqual(profile["counters"]["tokens"], 23)
+        self.assertEqual(profile["errors"], {"KeyError": 1})
+        self.assertEqual(profile["stages"]["lexer"]["count"], 5)
+        self.assertEqual(profile["lines"]["2"]["hits"], 1)
+        self.assertIn("y = x * 2", instruments.report())
+
+    def test_disabled(self):
+        with patch("instrumentation.perf_counter") as timer, patch(
+            "sys.stdout", new=io.StringIO()
+        ):
+            run_script(["x = 1", "PRINT x"], {})
+        timer.assert_not_called()
+
+
+class TestInputs(unittest.TestCase):
+    def run_with(self, provider, script: list[str]) -> Environment:
+        env: Environment = {}
+        previous = inputs.set_provider(provider)
+        try:
+            run_script(script, env)
+        finally:
+            inputs.set_provider(previous)
+        return env
+
+    def test_bound_inputs(self):
+        provider = inputs.BoundInputs({"x": ["1", 2], "y": "2.5"})
+        script = ["BEG x", "BEG y", "BEG x", "BEG y"]
+        self.assertEqual(provider.missing(inputs.find_begs(script, main.parse)), [])
+
+        env = self.run_with(provider, script)
+        self.assertEqual(env, {"x": 2, "y": 2.5})
+        self.assertIs(type(env["x"]), int)
+
+    def test_missing_inputs(self):
+        script = ["BEG x", "x = x + 1", "BEG y", "BEG x"]
+        begs = inputs.find_begs(script, main.parse)
+        self.assertEqual(begs, [(1, "x"), (3, "y"), (4, "x")])
+        self.assertEqual(
+            inputs.BoundInputs({"x": [1]}).missing(begs), [(3, "y"), (4, "x")]
+        )
+        self.assertEqual(inputs.SequenceInputs([1, 2]).missing(begs), [(4, "x")])
+
+        begs = inputs.find_begs(["BEG x", "EXIT!", "BEG y"], main.parse)
+        self.assertEqual(begs, [(1, "x")], "BEG commands after EXIT! are listed")
+
+        with self.assertRaises(
+            Error, msg="Provider accepts values that aren't numbers"
+        ):
+            inputs.SequenceInputs(["x"])
+
+    def test_sequence_inputs(self):
+        values = iter(range(100_000))
+        env = self.run_with(inputs.SequenceInputs(values), ["BEG x"] * 100_000)
+        self.assertEqual(env["x"], 99_999)
+
+    def test_load_inputs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "inputs.txt")
+            with open(path, "w") as file:
+                file.write("x = 1\ny = 2.5\nx = 3\n")
+
+            env = self.run_with(inputs.load_inputs(path), ["BEG x", "BEG x", "BEG y"])
+        self.assertEqual(env, {"x": 3, "y": 2.5})
+
+    def test_formats_agree(self):
+        files = {
+            "inputs.json": '{"x": 1, "y": [2.5]}',
+            "inputs.csv": "x,y\n1,2.5\n",
+            "inputs.txt": "x = 1\ny = 2.5\n",
+        }
+        begs = inputs.find_begs(["BEG x", "BEG y", "BEG x"], main.parse)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in files.items():
+                path = os.path.join(directory, name)
+                with open(path, "w") as file:
+                    file.write(text)
+
+                missing = inputs.load_inputs(path).missing(begs)
+                self.assertEqual(missing, [(3, "x")], f"{name} reuses its values")
+
+
+class TestReactive(unittest.TestCase):
+    def test_recompute(self):
+        script = ReactiveScript()
+        for command in ["a = 1", "b = 10", "x = a * 2", "y = x + b", "z = b - 1"]:
+            script.run(command)
+
+        self.assertEqual(script.run("a = 5"), ["x", "y"])
+        self.assertEqual(script.env, {"a": 5, "b": 10, "x": 10, "y": 20, "z": 9})
+
+        with patch("builtins.input", return_value="2.5"):
+            self.assertCountEqual(script.run("BEG b"), ["y", "z"])
+        self.assertEqual(set(script.failed), {"y", "z"})
+        self.assertNotIn("y", script.env)
+
+    def test_cycles(self):
+        script = ReactiveScript()
+        for command in ["a = 1", "b = a + 1", "c = b * 2"]:
+            script.run(command)
+
+        with self.assertRaises(Error, msg="Reactive script accepts cycles"):
+            script.run("a = c - 1")
+        self.assertEqual(script.env, {"a": 1, "b": 2, "c": 4})
+
+    def test_self_reference(self):
+        script = ReactiveScript()
+        for command in ["a = 1", "b = a + 1", "c = b * 2"]:
+            script.run(command)
+
+        # a counter is a one-time rebind, not a cycle
+        self.assertEqual(script.run("b = b + 1"), ["c"])
+        self.assertEqual(script.run("b = b + 1"), ["c"])
+        self.assertEqual(script.env, {"a": 1, "b": 4, "c": 8})
+
+        self.assertEqual(script.run("a = 5"), [], "Rebound variable keeps its formula")
+        self.assertEqual(script.env["b"], 4)
+
+        with self.assertRaises(ZeroDivisionError):
+            script.run("b = b / 0")
+        self.assertEqual(script.env["b"], 4)
+
+    def test_chain(self):
+        script = ReactiveScript()
+        script.run("v0 = 0")
+        for index in range(1, 2000):
+            script.run(f"v{index} = v{index - 1} + 1")
+        for index in range(2000):
+            script.run(f"w{index} = 1")
+
+        self.assertEqual(len(script.run("v1000 = 0")), 999)
+        self.assertEqual(script.env["v1999"], 999)
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        env: Environment = {"a": 1, "b": 1.0, "c": -0.0, "d": 10**30, "e": -(2**63)}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "env.snap")
+            snapshot.save(env, path)
+            restored = snapshot.load(path, SlotEnvironment())
+
+        self.assertEqual(restored, env)
+        for name, value in env.items():
+            self.assertIs(type(restored[name]), type(value), "Snapshot loses types")
+        self.assertEqual(str(restored["c"]), "-0.0")
+
+    def test_invalid_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "env.snap")
+            snapshot.save({"x": 1}, path)
+            with open(path, "r+b") as file:
+                file.truncate(os.path.getsize(path) - 1)
+
+            with self.assertRaises(Error, msg="Snapshot accepts truncated files"):
+                snapshot.load(path)
+
+
+class TestInference(unittest.TestCase):
+    def test_check_script(self):
+        script = ["x = 1", "y = x * 2 + 0.5", "BEG z", "w = z + 1.5", "v = w - 1.5"]
+        with patch("sys.stderr", new=io.StringIO()):
+            mismatches = inference.check_script(script, main.parse)
+        self.assertEqual(
+            mismatches,
+            [(2, "Cannot add <class 'int'> to <class 'float'>. Type mismatch.")],
+        )
+
+    def test_assign(self):
+        types: dict = {}
+        inference.assign(types, main.parse("x = 1 + 2"))
+        inference.assign(types, main.parse("y = 1.5 * 2.0"))
+        self.assertEqual(types, {"x": int, "y": None})
+
+        # a failing assignment keeps the previous type
+        inference.assign(types, main.parse("BEG x"))
+        inference.assign(types, main.parse("x = 3"))
+        self.assertEqual(types["x"], None)
+
+    def test_specialized_code(self):
+        program = vm.compile_script(["x = 5", "y = x / 2", "BEG z", "y = z / 2"])
+        self.assertEqual(program.lines[1][1][4], vm.Op.FLOOR_DIVIDE)
+        self.assertEqual(program.lines[3][1][4], vm.Op.BINARY_DIVIDE)
+
+        # x may keep its value if the assignment fails
+        program = vm.compile_script(["x = 5", "y = x / 2"], bound=["x"])
+        self.assertEqual(program.lines[1][1][4], vm.Op.BINARY_DIVIDE)
+
+
+class TestAPI(unittest.TestCase):
+    def test_run_many(self):
+        output: list[str] = []
+        commands = ["x = 5", "PRINT x", "y = z", "x * 2.0", "x = (", "EXIT!", "x = 6"]
+        with patch("sys.stdout", new=io.StringIO()) as out:
+            results = api.run_many(commands, {}, output.append)
+
+        self.assertEqual(out.getvalue(), "", "API prints to stdout")
+        self.assertEqual(output, ["5"])
+        self.assertEqual([result.status for result in results][-1], "exit")
+        self.assertEqual(len(results), 6, "API doesn't stop on EXIT!")
+        self.assertEqual(results[0].value, 5)
+        self.assertEqual(results[1].output, "5")
+        self.assertEqual(
+            [result.kind for result in results[2:5]], ["undefined", "runtime", "syntax"]
+        )
+        self.assertEqual(results[2].error, "Variable 'z' is not defined")
+        self.assertEqual(results[4].position, 4)
+
+    def test_type_mismatch_kind(self):
+        results = api.run_many(["y = 1", "x = 1 + 2.0", "x = y + 2.0"], {})
+
+        self.assertEqual([result.kind for result in results[1:]], ["runtime"] * 2)
+        self.assertEqual(results[1].error, results[2].error)
+
+
+class TestOutput(unittest.TestCase):
+    def test_policies(self):
+        stream = io.StringIO()
+        buffered = output.Output(stream, policy="size", size=8)
+        buffered.write("1234")
+        self.assertEqual(stream.getvalue(), "", "Output isn't buffered")
+        buffered.write("5678")
+        self.assertEqual(stream.getvalue(), "1234\n5678\n")
+
+        stream = io.StringIO()
+        output.Output(stream, policy="line").write("1")
+        self.assertEqual(stream.getvalue(), "1\n")
+
+    def test_error_order(self):
+        stream = io.StringIO()
+        previous = output.set_output(output.Output(stream, stream, policy="end"))
+        try:
+            run_script(["x = 1", "PRINT x", "PRINT y", "PRINT 2"], {})
+            self.assertEqual(
+                stream.getvalue(), "1\nError on line 3: Variable 'y' is not defined\n"
+            )
+        finally:
+            output.set_output(previous)
+        self.assertEqual(stream.getvalue().splitlines()[-1], "2")
+
+
+class TestDataflow(unittest.TestCase):
+    def optimize(self, lines: list[str]):
+        return dataflow.optimize_script(lines, main.parse)
+
+    def test_propagate_and_eliminate(self):
+        statements, eliminated = self.optimize(
+            ["a = 2", "t = a * 3", "t = t + 1", "b = t * 2", "PRINT b", "b = 1"]
+        )
+        self.assertEqual(eliminated, 1, "Dead stores are kept")
+        self.assertEqual([s.lineno for s in statements], [1, 3, 4, 5, 6])
+        self.assertEqual(statements[2].ast, parser(lexer("b = 14")))
+        self.assertTrue(statements[2].rewritten)
+
+    def test_failures_are_kept(self):
+        # an assignment that may fail leaves the previous value live
+        _, eliminated = self.optimize(["x = 1", "x = y", "PRINT x"])
+        self.assertEqual(eliminated, 0)
+
+        # a division by zero is reported and the script goes on
+        _, eliminated = self.optimize(["x = 1", "z = 1 / y", "x = 2"])
+        self.assertEqual(eliminated, 1)
+
+        # BEG ends the script when its input runs out, so every value is live
+        _, eliminated = self.optimize(["x = 1", "BEG z", "x = 2"])
+        self.assertEqual(eliminated, 0)
+
+        statements, eliminated = self.optimize(["x = 1", "x = 2", "x = y +"])
+        self.assertEqual((eliminated, statements[-1].ast), (1, None))
+
+    def test_run_script(self):
+        script = ["x = 4", "y = x * x", "y = y - 1", "z", "PRINT y", "w = q"]
+        for optimize in (False, True):
+            env: Environment = {}
+            with patch("sys.stdout", new=io.StringIO()) as out:
+                with patch("sys.stderr", new=io.StringIO()) as err:
+                    status = run_script(script, env, optimize)
+                    output.flush()
+            self.assertEqual(status, 1)
+            self.assertEqual(out.getvalue(), "15\n")
+            self.assertIn("line 6", err.getvalue())
+            self.assertEqual(env, {"x": 4, "y": 15})
+
+    def test_report_eliminated(self):
+        script = ["x = 1", "x = 2", "PRINT x"]
+        with patch("sys.stdout", new=io.StringIO()) as out:
+            with patch("sys.stderr", new=io.StringIO()) as err:
+                run_script(script, {}, optimize=True)
+                output.flush()
+        self.assertEqual(out.getvalue(), "2\n")
+        self.assertEqual(err.getvalue(), "Eliminated statements: 1\n")
+
+        # with --profile, the count is listed in the report instead
+        instruments = Instruments()
+        with patch("main.instruments", instruments), patch(
+            "sys.stdout", new=io.StringIO()
+        ), patch("sys.stderr", new=io.StringIO()) as err:
+            run_script(["x = 1", "PRINT x"], {}, optimize=True)
+            output.flush()
+        self.assertEqual(err.getvalue(), "")
+        self.assertIn("eliminated statements: 0", instruments.report())
+
+
+class TestConformance(unittest.TestCase):
+    def test_engines_agree(self):
+        failures = conformance.check(0, 0, 300, list(conformance.ENGINES))
+        self.assertEqual(failures, [], "Engines disagree with the reference")
+
+    def test_error_order(self):
+        # compile time errors used to preempt the undefined variable
+        case = (["a - (7.25 + 0)", "a = (x1 + ())"], [])
+        for engine in conformance.ENGINES.values():
+            self.assertFalse(conformance.differs(engine, case))
+
+    def test_reference_is_frozen(self):
+        def last_sign(expression):
+            # a broken folding, keeping the last sign of a run
+            operator = None
+            while expression.peek()[0] == "PRECEDENCE 1":
+                operator = expression.next()[1]
+            return operator
+
+        engine = conformance.ENGINES["evaluator"]
+        case = (["x = 5 - - 3", "PRINT x"], [])
+        self.assertFalse(conformance.differs(engine, case))
+
+        # the reference doesn't share the parser it checks
+        with patch("parser._fold_signs", last_sign):
+            self.assertTrue(conformance.differs(engine, case), "Reference changed")
+
+    def test_shrink(self):
+        def broken(command: str, env: Environment):
+            conformance.reference(command.replace("*", "+"), env)
+
+        engine = conformance._line_engine(broken)
+        case = (["x = 3", "BEG y", "z = x * 2 + 1", "PRINT z"], [4])
+        self.assertTrue(conformance.differs(engine, case))
+        lines, values = conformance.shrink(engine, case)
+        self.assertEqual((len(lines), values), (1, []), "Program isn't shrunk")
+        self.assertIn("*", lines[0])
+        self.assertTrue(conformance.differs(engine, (lines, values)))
+
+
+class TestTokenizer(unittest.TestCase):
+    script = "x = 5\r\n\r\n  y=x*2+1 \r\n  z  =   x $ 2\r\nPRINT x\r\nEXIT!\r\nPRINT y"
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".snol", delete=False) as file:
+            file.write(self.script)
+        self.path = file.name
+        self.addCleanup(os.unlink, self.path)
+
+    def test_tokens(self):
+        expected = [line.rstrip() for line in self.script.splitlines()]
+
+        for line in tokenize_file(self.path):
+            command = expected[line.lineno - 1]
+            self.assertEqual(line.text(), command)
+
+            if "$" in command:
+                with self.assertRaisesRegex(Error, "Invalid token: \\$ at column 12"):
+                    line.tokens()
+            else:
+                self.assertEqual(line.tokens(), lexer(command))
+
+        lines = [line.lineno for line in tokenize_file(self.path)]
+        self.assertEqual(lines, [1, 3, 4, 5, 6, 7], "Blank lines aren't skipped")
+
+    def test_run_file(self):
+        def run_text(path: str, env: Environment) -> int:
+            with open(path) as script:
+                return run_script(script, env)
+
+        def run_uncached(path: str, env: Environment) -> int:
+            with patch("main.cache", None):
+                return run_text(path, env)
+
+        def run_optimized(path: str, env: Environment) -> int:
+            with open(path) as script:
+                return run_script(script, env, optimize=True)
+
+        def run_vm(path: str, env: Environment) -> int:
+            with open(path) as script:
+                return vm.run(vm.compile_script(script), env)
+
+        # every path reports the column of the file, not of the stripped line
+        for run in (main.run_file, run_text, run_uncached, run_optimized, run_vm):
+            env: Environment = {}
+            with patch("sys.stdout", new=io.StringIO()) as out, patch(
+                "sys.stderr", new=io.StringIO()
+            ) as err:
+                status = run(self.path, env)
+                output.flush()
+            self.assertEqual(status, 1)
+            self.assertEqual(out.getvalue(), "5\n\nExiting SNOL Program...\n")
+            self.assertEqual(
+                err.getvalue().splitlines()[0],
+                "Error on line 4: Invalid token: $ at column 12",
+            )
+            if run is run_optimized:
+                self.assertEqual(
+                    err.getvalue().splitlines()[1:], ["Eliminated statements: 0"]
+                )
+            else:
+                self.assertEqual(len(err.getvalue().splitlines()), 1)
+            self.assertEqual(env, {"x": 5, "y": 11})
+
+
+class TestScript(unittest.TestCase):
+    def test_run_script(self):
+        env: Environment = {}
+        script = ["x = 5", "", "y = x * 2", "PRINT y"]
+        with patch("sys.stdout", new=io.StringIO()) as out:
+            status = run_script(script, env)
+        self.assertEqual(status, 0, "Script runner fails on a valid script")
+        self.assertEqual(out.getvalue(), "10\n")
+        self.assertEqual(env, {"x": 5, "y": 10})
+
+    def test_run_script_reports_line(self):
+        env: Environment = {}
+        script = ["x = 5", "y = z + 1", "PRINT x"]
+        with patch("sys.stdout", new=io.StringIO()), patch(
+            "sys.stderr", new=io.StringIO()
+        ) as err:
+            status = run_script(script, env)
+        self.assertEqual(status, 1, "Script runner doesn't report failures")
+        self.assertIn("line 2", err.getvalue())
+
+    def test_run_script_exit(self):
+        env: Environment = {}
+        script = ["x = 5", "EXIT!", "x = 6"]
+        with patch("sys.stdout", new=io.StringIO()):
+            status = run_script(script, env)
+        self.assertEqual(status, 0)
+        self.assertEqual(env["x"], 5, "Script runner doesn't stop on EXIT!")
+
+    def test_run_script_arithmetic_errors(self):
+        large = "1" + "0" * 200 + ".0"
+        script = ["x = 5", "y = x / 0", f"z = {large} * {large}", "PRINT x"]
+
+        for run in (
+            lambda env: run_script(script, env),
+            lambda env: run_script(script, env, optimize=True),
+            lambda env: vm.run(vm.compile_script(script), env),
+        ):
+            env: Environment = {}
+            with patch("sys.stdout", new=io.StringIO()) as out, patch(
+                "sys.stderr", new=io.StringIO()
+            ) as err:
+                status = run(env)
+            self.assertEqual(status, 1)
+            self.assertIn("Error on line 2: integer division", err.getvalue())
+            self.assertIn("Error on line 3: cannot convert float", err.getvalue())
+            self.assertEqual(out.getvalue(), "5\n", "Script runner stops on errors")
+            self.assertEqual(env, {"x": 5})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,159 @@
+"""
+Tokenization of whole script files.
+
+    for line in tokenize_file("script.snol"):
+        ast = parser(line.tokens())
+
+The file is memory-mapped and a single bytes pattern runs over the whole
+mapping in one pass. Each line with tokens is yielded as a `TokenLine`,
+holding the type codes of its tokens and their offsets into the mapping in
+compact arrays, so no string, tuple or int object is made per token until
+the tokens of the line are needed. Lines are yielded one at a time, and the pages already
+scanned are released, so memory stays flat however large the file is.
+"""
+
+import mmap
+import os
+import re
+from array import array
+from collections.abc import Iterator
+
+from interfaces import Token
+from lexer import EOF_TOKEN, _KINDS, _TOKEN_TYPES, _number, lexer
+
+# The newline is matched as a token, at group 1, so lines are split in the
+# same pass. The other token types follow in the order of the lexer.
+_NEWLINE = 1
+_PATTERN = re.compile(
+    rb"(?P<NEWLINE>\r\n?|\n)|"
+    + b"|".join(
+        b"(?P<%s>%s)" % (name.encode(), regex.encode())
+        for name, regex in _TOKEN_TYPES.items()
+    )
+)
+
+# The token type of each code, which is the index of its group
+_TYPES = [None, None] + [_KINDS[name] for name in _TOKEN_TYPES]
+_NUMBER = _TYPES.index("NUMBER")
+_INVALID = _TYPES.index("INVALID")
+
+# The number of scanned bytes after which their pages are released
+RELEASE_SIZE = 8 * 1024 * 1024
+
+
+class TokenLine:
+    """
+    The tokens of a line of a mapped file: the type code of each token, and
+    the offset where each token starts, followed by the offset where the
+    line ends. Tokens hold no whitespace, so a token ends where the spaces
+    before the next one start. A line is only valid until the file is closed.
+    """
+
+    __slots__ = ("mapping", "lineno", "start", "codes", "offsets")
+
+    def __init__(
+        self,
+        mapping: mmap.mmap,
+        lineno: int,
+        start: int,
+        codes: bytearray,
+        offsets: array,
+    ) -> None:
+        self.mapping = mapping
+        self.lineno = lineno
+        self.start = start
+        self.codes = codes
+        self.offsets = offsets
+
+    def text(self) -> str:
+        """
+        :return str: the command on the line with its indentation, as
+                     `main.run_script` reads it, empty if its only tokens are
+                     Unicode spaces
+        """
+
+        return self.mapping[self.start : self.offsets[-1]].decode().rstrip()
+
+    def tokens(self) -> list[Token]:
+        """
+        Materializes the tokens of the line, as `lexer.lexer` returns them.
+
+        :raises: Error on invalid tokens, at their column in the file
+        """
+
+        if _INVALID in self.codes:
+            # Unicode digits and spaces aren't matched by the bytes pattern,
+            # the text is lexed again to classify them as the lexer does
+            return lexer(self.text())
+
+        offsets = self.offsets
+        base = offsets[0]
+        # only ASCII is left, so the offsets in the text match the mapping
+        line = self.mapping[base : offsets[-1]].decode()
+        tokens: list[Token] = []
+
+        for index, code in enumerate(self.codes):
+            text = line[offsets[index] - base : offsets[index + 1] - base].rstrip()
+
+            if code == _NUMBER:
+                tokens.append(_number(text))
+            else:
+                tokens.append((_TYPES[code], text))
+
+        tokens.append(EOF_TOKEN)
+        return tokens
+
+
+def tokenize_file(path: str | os.PathLike) -> Iterator[TokenLine]:
+    """
+    Blank lines are skipped, and the lines of the file are numbered from 1.
+
+    :param path str: the script file
+    :return Iterator[TokenLine]: the lines of the file that have tokens
+    """
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            yield from _scan(mapping)
+
+
+def _scan(mapping: mmap.mmap) -> Iterator[TokenLine]:
+    release = getattr(mmap, "MADV_DONTNEED", None)
+    released = 0
+
+    lineno = 1
+    start = 0
+    codes = bytearray()
+    offsets = array("Q")
+
+    for match in _PATTERN.finditer(mapping):
+        code = match.lastindex
+
+        if code != _NEWLINE:
+            codes.append(code)
+            offsets.append(match.start())
+            continue
+
+        end = match.start()
+
+        if codes:
+            offsets.append(end)
+            yield TokenLine(mapping, lineno, start, codes, offsets)
+            codes = bytearray()
+            offsets = array("Q")
+
+        lineno += 1
+        start = match.end()
+
+        if release is not None and end - released >= RELEASE_SIZE:
+            # the scanned pages are read again from the file if needed
+            size = (end - released) // mmap.PAGESIZE * mmap.PAGESIZE
+            mapping.madvise(release, released, size)
+            released += size
+
+    if codes:
+        offsets.append(len(mapping))
+        yield TokenLine(mapping, lineno, start, codes, offsets)
@@ -0,0 +1,296 @@
+"""
+Evaluates a SNOL expression over many rows of variable bindings at once,
+using NumPy arrays instead of calling the evaluator once per row.
+
+Rows where the evaluator would fail, because of a type mismatch, an undefined
+variable, a division by zero, or an int that does not fit in 64 bits, are
+reported in a mask instead of raising.
+"""
+
+import csv
+from collections.abc import Mapping
+
+import numpy as np
+
+from interfaces import Error, Node, NodeType, Operator, to_number
+
+_INT_MIN = np.iinfo(np.int64).min
+
+
+class Column:
+    """
+    The values of an expression over all rows. Every row holds either an int
+    or a float, as decided by `is_float`, so each row keeps the type rules of
+    the evaluator. Rows in `failed` have no value.
+    """
+
+    __slots__ = ("ints", "floats", "is_float", "failed")
+
+    def __init__(
+        self,
+        ints: np.ndarray,
+        floats: np.ndarray,
+        is_float: np.ndarray,
+        failed: np.ndarray,
+    ) -> None:
+        self.ints = ints
+        self.floats = floats
+        self.is_float = is_float
+        self.failed = failed
+
+    def __len__(self) -> int:
+        return len(self.failed)
+
+    def values(self) -> np.ndarray:
+        """
+        :return np.ndarray: the values as int64 or float64 if every row that
+                            did not fail has the same type, else as objects
+        """
+
+        rows = ~self.failed
+
+        if not self.is_float[rows].any():
+            return self.ints
+        if self.is_float[rows].all():
+            return self.floats
+
+        values = self.ints.astype(object)
+        values[self.is_float] = self.floats[self.is_float]
+        return values
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "Column":
+        """
+        Converts the bindings of a variable into a column. Integer and float
+        arrays give a column of a single type, while object arrays may mix
+        ints and floats, with None marking rows where the variable is not
+        defined.
+        """
+
+        array = np.asarray(array)
+        size = len(array)
+        ints = np.zeros(size, np.int64)
+        floats = np.zeros(size, np.float64)
+        is_float = np.zeros(size, bool)
+        failed = np.zeros(size, bool)
+
+        if array.dtype.kind in "iu":
+            ints = array.astype(np.int64)
+            failed = (
+                array > np.iinfo(np.int64).max if array.dtype.kind == "u" else failed
+            )
+        elif array.dtype.kind == "f":
+            floats = array.astype(np.float64)
+            is_float[:] = True
+        elif array.dtype.kind == "O":
+            for row, value in enumerate(array):
+                if isinstance(value, float):
+                    floats[row] = value
+                    is_float[row] = True
+                elif isinstance(value, int) and not isinstance(value, bool):
+                    if _INT_MIN <= value <= np.iinfo(np.int64).max:
+                        ints[row] = value
+                    else:
+                        failed[row] = True
+                else:
+                    failed[row] = True
+        else:
+            raise Error(f"Cannot evaluate values of type {array.dtype}")
+
+        return cls(ints, floats, is_float, failed)
+
+    @classmethod
+    def full(cls, value: int | float, size: int) -> "Column":
+        is_float = type(value) == float
+
+        if not is_float and not _INT_MIN <= value <= np.iinfo(np.int64).max:
+            raise Error(f"Cannot evaluate {value} in batch, it is too large")
+
+        return cls(
+            np.full(size, 0 if is_float else value, np.int64),
+            np.full(size, value if is_float else 0, np.float64),
+            np.full(size, is_float, bool),
+            np.zeros(size, bool),
+        )
+
+
+def batch_evaluator(ast: Node, columns: Mapping[str, np.ndarray]) -> Column:
+    """
+    :param ast Node: an expression or assignment, as returned by the parser
+    :param columns Mapping: the bindings of each variable, one array per
+                            variable, all of the same length
+    :return Column: the result of the expression for each row, for an
+                    assignment the value that would be assigned
+    :raises: Error if the command cannot be evaluated in batch
+    """
+
+    lengths = {len(column) for column in columns.values()}
+
+    if len(lengths) > 1:
+        raise Error("All columns must have the same number of rows")
+
+    size = lengths.pop() if lengths else 1
+    bindings = {name: Column.from_array(array) for name, array in columns.items()}
+
+    match ast.node_type:
+        case NodeType.EXPRESSION | NodeType.TERM | NodeType.FACTOR:
+            return _evaluate(ast, bindings, size)
+        case NodeType.ASSIGNMENT:
+            return _assign(_evaluate(ast.children[0], bindings, size))
+        case _:
+            raise Error("Only expressions and assignments can be evaluated in batch")
+
+
+def _evaluate(ast: Node | None, bindings: dict[str, Column], size: int) -> Column:
+    if ast is None:
+        raise Error("Cannot evaluate expression")
+
+    if ast.op is not None:
+        left = _evaluate(ast.children[0], bindings, size)
+        right = _evaluate(ast.children[1], bindings, size)
+        return _binary(ast.op, left, right)
+
+    if ast.number is not None:
+        return Column.full(ast.number, size)
+
+    val = str(ast.value)
+
+    if val == "None":
+        return _evaluate(ast.children[0], bindings, size)
+    if val[0] == "-":
+        return _negate(_variable(val[1:], bindings, size))
+    return _variable(val, bindings, size)
+
+
+def _variable(name: str, bindings: dict[str, Column], size: int) -> Column:
+    column = bindings.get(name)
+
+    if column is None:
+        # the variable is not defined in any row
+        column = Column.full(0, size)
+        column.failed[:] = True
+
+    return column
+
+
+def _negate(column: Column) -> Column:
+    overflow = ~column.is_float & (column.ints == _INT_MIN)
+
+    with np.errstate(all="ignore"):
+        return Column(
+            -column.ints, -column.floats, column.is_float, column.failed | overflow
+        )
+
+
+def _binary(op: Operator, left: Column, right: Column) -> Column:
+    is_float = left.is_float
+    failed = left.failed | right.failed | (left.is_float != right.is_float)
+
+    a, b = left.ints, right.ints
+    x, y = left.floats, right.floats
+
+    with np.errstate(all="ignore"):
+        match op:
+            case Operator.ADD:
+                ints = a + b
+                int_errors = ((a ^ ints) & (b ^ ints)) < 0
+                floats = x + y
+                float_errors = None
+            case Operator.SUBTRACT:
+                ints = a - b
+                int_errors = ((a ^ b) & (a ^ ints)) < 0
+                floats = x - y
+                float_errors = None
+            case Operator.MULTIPLY:
+                ints = a * b
+                divisor = np.where(b == 0, 1, b)
+                int_errors = (ints // divisor != a) & (b != 0)
+                int_errors |= (a == _INT_MIN) & (b == -1)
+                int_errors |= (b == _INT_MIN) & (a == -1)
+                floats = x * y
+                float_errors = None
+            case Operator.DIVIDE:
+                divisor = np.where(b == 0, 1, b)
+                ints = a // divisor
+                int_errors = (b == 0) | ((a == _INT_MIN) & (b == -1))
+                floats = x / y
+                float_errors = y == 0
+            case Operator.MODULO:
+                divisor = np.where(b == 0, 1, b)
+                ints = a % divisor
+                int_errors = b == 0
+                floats = np.remainder(x, y)
+                float_errors = y == 0
+
+    failed |= ~is_float & int_errors
+    if float_errors is not None:
+        failed |= is_float & float_errors
+
+    return Column(ints, floats, is_float, failed)
+
+
+def _assign(column: Column) -> Column:
+    """
+    Assignments convert their value to an int, keeping it a float only when
+    the conversion fails, as with NaN.
+    """
+
+    floats = column.floats
+    nan = np.isnan(floats)
+    truncated = column.is_float & ~nan
+
+    with np.errstate(all="ignore"):
+        in_range = (floats >= -(2.0**63)) & (floats < 2.0**63)
+        ints = np.where(truncated & in_range, floats, 0).astype(np.int64)
+
+    return Column(
+        np.where(truncated, ints, column.ints),
+        floats,
+        column.is_float & nan,
+        column.failed | (truncated & ~in_range),
+    )
+
+
+def load_columns(path: str) -> dict[str, np.ndarray]:
+    """
+    Loads variable bindings from a file. NPZ files hold one array per
+    variable, NPY files a structured array with one field per variable, and
+    CSV files a header row naming the variables. Empty CSV cells leave the
+    variable undefined for that row.
+    """
+
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    if path.endswith(".npy"):
+        data = np.load(path)
+        if data.dtype.names is None:
+            raise Error("NPY bindings must be a structured array")
+        return {name: data[name] for name in data.dtype.names}
+
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        names = [name.strip() for name in next(reader)]
+        cells: list[list] = [[] for _ in names]
+
+        for row in reader:
+            for column, cell in zip(cells, row):
+                cell = cell.strip()
+                column.append(to_number(cell) if cell else None)
+
+    return {name: _to_array(column) for name, column in zip(names, cells)}
+
+
+def _to_array(values: list) -> np.ndarray:
+    if all(type(value) == int for value in values):
+        try:
+            return np.array(values, np.int64)
+        except OverflowError:
+            pass
+    elif all(type(value) == float for value in values):
+        return np.array(values, np.float64)
+
+    array = np.empty(len(values), object)
+    array[:] = values
+    return array
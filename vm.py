@@ -0,0 +1,443 @@
+"""
+A stack based virtual machine for SNOL scripts.
+
+A script is compiled to bytecode once, line by line, and the bytecode can be
+saved next to the script in a `.snolc` file keyed by the hash of the source,
+so that running an unchanged script again skips the lexer, the parser and the
+optimizer entirely.
+"""
+
+import hashlib
+import io
+import marshal
+from enum import IntEnum
+from typing import Callable, Iterable
+
+from interfaces import Error, Node, NodeType, Operator, Environment, describe
+import inputs
+import output
+from lexer import lexer
+from parser import parser
+from optimizer import optimizer
+from inference import Type, assign
+
+
+class Op(IntEnum):
+    LOAD_CONST = 0
+    LOAD_VAR = 1
+    LOAD_NEG_VAR = 2
+    BINARY_ADD = 3
+    BINARY_SUBTRACT = 4
+    BINARY_MULTIPLY = 5
+    BINARY_DIVIDE = 6
+    BINARY_MODULO = 7
+    STORE = 8
+    PRINT_CONST = 9
+    PRINT_VAR = 10
+    READ = 11
+    EXIT = 12
+    ERROR = 13
+    # operations on operands whose types are known to match, see `inference.py`
+    ADD = 14
+    SUBTRACT = 15
+    MULTIPLY = 16
+    FLOOR_DIVIDE = 17
+    TRUE_DIVIDE = 18
+    MODULO = 19
+
+
+# Bumped whenever the instruction set changes, to invalidate `.snolc` files
+VERSION = 2
+MAGIC = b"SNOLC\0"
+
+_VERBS = {
+    Op.BINARY_ADD: "add",
+    Op.BINARY_SUBTRACT: "subtract",
+    Op.BINARY_MULTIPLY: "multiply",
+    Op.BINARY_DIVIDE: "divide",
+    Op.BINARY_MODULO: "modulo",
+}
+
+
+class Program:
+    """
+    A compiled script. Each line of the script has its own code, a flat list
+    of alternating opcodes and arguments, so an error only stops its line.
+    Arguments index into the shared `consts` and `names` tables.
+    """
+
+    def __init__(self) -> None:
+        self.consts: list = []
+        self.names: list[str] = []
+        self.lines: list[tuple[int, list[int]]] = []
+        self._consts: dict[tuple[type, object], int] = {}
+        self._names: dict[str, int] = {}
+
+    def const(self, value) -> int:
+        key = (type(value), value)
+        index = self._consts.get(key)
+
+        if index is None:
+            index = self._consts[key] = len(self.consts)
+            self.consts.append(value)
+
+        return index
+
+    def name(self, name: str) -> int:
+        index = self._names.get(name)
+
+        if index is None:
+            index = self._names[name] = len(self.names)
+            self.names.append(name)
+
+        return index
+
+    def dumps(self, digest: str) -> bytes:
+        return MAGIC + marshal.dumps(
+            (VERSION, digest, self.consts, self.names, self.lines)
+        )
+
+    @classmethod
+    def loads(cls, data: bytes, digest: str) -> "Program | None":
+        """
+        :return Program | None: the program, or None if the data was written
+                                for another source or version
+        """
+
+        if not data.startswith(MAGIC):
+            return None
+
+        try:
+            version, source, consts, names, lines = marshal.loads(data[len(MAGIC) :])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        if version != VERSION or source != digest:
+            return None
+
+        program = cls()
+        program.consts = consts
+        program.names = names
+        program.lines = lines
+        return program
+
+
+def front_end(command: str) -> Node:
+    return optimizer(parser(lexer(command)))
+
+
+def compile_script(
+    lines: Iterable[str],
+    front_end: Callable[[str], Node] = front_end,
+    bound: Iterable[str] = (),
+) -> Program:
+    """
+    Compiles the lines of a script. Lines that fail to compile are kept as an
+    ERROR instruction, so the error is reported when the line is reached.
+
+    Operations are specialized on the types inferred for the variables, which
+    assumes that the variables are not defined before the script runs, other
+    than the `bound` ones.
+
+    :param lines Iterable[str]: the lines of the script, e.g. an open file
+    :param bound Iterable[str]: the variables defined before the script runs
+    :return Program: the compiled script
+    """
+
+    program = Program()
+    types: dict[str, Type] = {name: None for name in bound}
+
+    for lineno, line in enumerate(lines, start=1):
+        command = line.rstrip()  # indented, for the columns of errors
+        if not command:
+            continue
+
+        code: list[int] = []
+        try:
+            ast = front_end(command)
+            _emit_command(ast, code, program, types)
+            assign(types, ast)
+        except Error as e:
+            code = [Op.ERROR, program.const(str(e))]
+
+        program.lines.append((lineno, [int(instruction) for instruction in code]))
+
+    return program
+
+
+def _emit_command(ast: Node, code: list[int], program: Program, types: dict[str, Type]):
+    match ast.node_type:
+        case NodeType.EXIT:
+            code += [Op.EXIT, 0]
+        case NodeType.BEG:
+            code += [Op.READ, program.name(str(ast.value))]
+        case NodeType.OUTPUT:
+            if ast.value == "VARIABLE":
+                code += [Op.PRINT_VAR, program.name(str(ast.children[0]))]
+            else:
+                code += [Op.PRINT_CONST, program.const(str(ast.children[0]))]
+        case NodeType.ASSIGNMENT:
+            _emit_expression(ast.children[0], code, program, types, "expression")
+            code += [Op.STORE, program.name(str(ast.value))]
+        case NodeType.EXPRESSION | NodeType.TERM | NodeType.FACTOR:
+            _emit_expression(ast, code, program, types, "expression")
+
+
+def _emit_expression(
+    ast: Node | None,
+    code: list[int],
+    program: Program,
+    types: dict[str, Type],
+    kind: str,
+) -> Type:
+    """
+    Emits the code of an expression in post-order, so operands are pushed
+    before their operator pops them. The tree is walked with an explicit
+    stack instead of recursion, so expressions of any depth can be compiled.
+    `kind` is what the evaluator would be evaluating at that position, which
+    names the error on missing operands.
+
+    Operators whose operands are known to have the same type are emitted
+    without a type check.
+
+    :return Type: the type of the expression, if known
+    """
+
+    # an operator is queued after its operands, with None as its kind
+    work: list = [(ast, kind)]
+    results: list[Type] = []
+
+    while work:
+        ast, kind = work.pop()
+
+        if kind is None:
+            right = results.pop()
+            left = results.pop()
+
+            if left is None or left != right:
+                code += [Op.BINARY_ADD + ast, 0]
+                results.append(None if left and right else left or right)
+            elif ast == Operator.DIVIDE:
+                code += [Op.FLOOR_DIVIDE if left == int else Op.TRUE_DIVIDE, 0]
+                results.append(left)
+            else:
+                code += [_UNCHECKED[ast], 0]
+                results.append(left)
+            continue
+
+        if ast is None:
+            code += [Op.ERROR, program.const(f"Cannot evaluate {kind}")]
+            results.append(None)
+            continue
+
+        if ast.op is not None:
+            is_term = ast.op >= Operator.MULTIPLY
+            work.append((ast.op, None))
+            work.append((ast.children[1], "factor" if is_term else "term"))
+            work.append((ast.children[0], "term" if is_term else "expression"))
+            continue
+
+        if ast.number is not None:
+            code += [Op.LOAD_CONST, program.const(ast.number)]
+            results.append(type(ast.number))
+            continue
+
+        val = str(ast.value)
+
+        if val == "None":
+            work.append((ast.children[0], "expression"))
+        elif val[0] == "-":
+            code += [Op.LOAD_NEG_VAR, program.name(val[1:])]
+            results.append(types.get(val[1:]))
+        else:
+            code += [Op.LOAD_VAR, program.name(val)]
+            results.append(types.get(val))
+
+    return results[0]
+
+
+_UNCHECKED = {
+    Operator.ADD: Op.ADD,
+    Operator.SUBTRACT: Op.SUBTRACT,
+    Operator.MULTIPLY: Op.MULTIPLY,
+    Operator.MODULO: Op.MODULO,
+}
+
+
+def run(program: Program, env: Environment) -> int:
+    """
+    Runs a compiled script. Errors are reported to stderr along with their
+    line number, and execution continues with the next line.
+
+    :return int: the exit code, 0 if every line ran without errors, else 1
+    """
+
+    status = 0
+    consts, names = program.consts, program.names
+
+    for lineno, code in program.lines:
+        try:
+            if _execute(code, consts, names, env):
+                break
+        except (Error, KeyError, ValueError, ArithmeticError) as e:
+            output.error(f"Error on line {lineno}: {describe(e)}")
+            status = 1
+
+    return status
+
+
+_LOAD_CONST = int(Op.LOAD_CONST)
+_LOAD_VAR = int(Op.LOAD_VAR)
+_LOAD_NEG_VAR = int(Op.LOAD_NEG_VAR)
+_BINARY_ADD = int(Op.BINARY_ADD)
+_BINARY_SUBTRACT = int(Op.BINARY_SUBTRACT)
+_BINARY_MULTIPLY = int(Op.BINARY_MULTIPLY)
+_BINARY_DIVIDE = int(Op.BINARY_DIVIDE)
+_BINARY_MODULO = int(Op.BINARY_MODULO)
+_STORE = int(Op.STORE)
+_PRINT_CONST = int(Op.PRINT_CONST)
+_PRINT_VAR = int(Op.PRINT_VAR)
+_READ = int(Op.READ)
+_EXIT = int(Op.EXIT)
+_ADD = int(Op.ADD)
+_SUBTRACT = int(Op.SUBTRACT)
+_MULTIPLY = int(Op.MULTIPLY)
+_FLOOR_DIVIDE = int(Op.FLOOR_DIVIDE)
+_TRUE_DIVIDE = int(Op.TRUE_DIVIDE)
+_MODULO = int(Op.MODULO)
+
+
+def _execute(code: list[int], consts: list, names: list[str], env: Environment) -> bool:
+    """
+    The dispatch loop, running the code of a single line.
+
+    :return bool: True if the line exits the program
+    """
+
+    stack: list = []
+    push = stack.append
+    pop = stack.pop
+    pc = 0
+    end = len(code)
+
+    while pc < end:
+        op = code[pc]
+        arg = code[pc + 1]
+        pc += 2
+
+        if op == _LOAD_VAR:
+            push(env[names[arg]])
+        elif op == _LOAD_CONST:
+            push(consts[arg])
+        elif op >= _ADD:
+            op2 = pop()
+            op1 = pop()
+
+            if op == _ADD:
+                push(op1 + op2)
+            elif op == _SUBTRACT:
+                push(op1 - op2)
+            elif op == _MULTIPLY:
+                push(op1 * op2)
+            elif op == _FLOOR_DIVIDE:
+                push(op1 // op2)
+            elif op == _TRUE_DIVIDE:
+                push(op1 / op2)
+            else:
+                push(op1 % op2)
+        elif _BINARY_ADD <= op <= _BINARY_MODULO:
+            op2 = pop()
+            op1 = pop()
+
+            if type(op1) != type(op2):
+                raise Error(
+                    f"Cannot {_VERBS[op]} {type(op1)} to {type(op2)}. Type mismatch."
+                )
+
+            if op == _BINARY_ADD:
+                push(op1 + op2)
+            elif op == _BINARY_SUBTRACT:
+                push(op1 - op2)
+            elif op == _BINARY_MULTIPLY:
+                push(op1 * op2)
+            elif op == _BINARY_DIVIDE:
+                push(op1 // op2 if type(op1) == int else op1 / op2)
+            else:
+                push(op1 % op2)
+        elif op == _LOAD_NEG_VAR:
+            push(-env[names[arg]])
+        elif op == _STORE:
+            value = pop()
+            try:
+                env[names[arg]] = int(value)
+            except ValueError:
+                env[names[arg]] = float(value)
+        elif op == _PRINT_VAR:
+            output.write(str(env[names[arg]]))
+        elif op == _PRINT_CONST:
+            output.write(str(consts[arg]))
+        elif op == _READ:
+            env[names[arg]] = inputs.read(names[arg])
+        elif op == _EXIT:
+            output.write("\nExiting SNOL Program...")
+            return True
+        else:
+            raise Error(consts[arg])
+
+    return False
+
+
+def disassemble(program: Program) -> str:
+    """
+    :return str: a listing of the instructions of every line
+    """
+
+    listing = []
+
+    for lineno, code in program.lines:
+        listing.append(f"line {lineno}:")
+
+        for pc in range(0, len(code), 2):
+            op, arg = Op(code[pc]), code[pc + 1]
+
+            if op in (Op.LOAD_CONST, Op.PRINT_CONST, Op.ERROR):
+                operand = f"{arg} ({program.consts[arg]!r})"
+            elif op in (Op.LOAD_VAR, Op.LOAD_NEG_VAR, Op.STORE, Op.PRINT_VAR, Op.READ):
+                operand = f"{arg} ({program.names[arg]})"
+            else:
+                operand = ""
+
+            listing.append(f"    {pc:>4} {op.name:<16} {operand}".rstrip())
+
+    return "\n".join(listing)
+
+
+def load_script(path: str) -> Program:
+    """
+    Compiles the script at the given path, reusing its `.snolc` file if it was
+    compiled from the same source, and writing it otherwise.
+    """
+
+    with open(path, "rb") as file:
+        source = file.read()
+
+    digest = hashlib.sha256(source).hexdigest()
+    cache_path = path + "c"
+
+    try:
+        with open(cache_path, "rb") as file:
+            program = Program.loads(file.read(), digest)
+        if program is not None:
+            return program
+    except OSError:
+        pass
+
+    program = compile_script(io.TextIOWrapper(io.BytesIO(source)))
+
+    try:
+        with open(cache_path, "wb") as file:
+            file.write(program.dumps(digest))
+    except OSError:
+        pass  # the cache is only an optimization
+
+    return program